@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""
+Read callback overhead
+
+Compares per-stream ctypes closures (one pa_stream_request_cb_t thunk per
+stream calling a bound method, as volctl did before) with the shared
+trampoline in volctl.lib.streams that dispatches on the slot passed as
+userdata. The callbacks are invoked through their C function pointers, so
+both paths cross the ctypes boundary like libpulse calls do; handlers do no
+work, only dispatch is measured.
+
+Needs libpulse (no running server).
+
+    python benchmarks/callback_bench.py --streams 50
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+# pylint: disable=wrong-import-position,protected-access
+from volctl.lib import streams
+from volctl.lib.pulseaudio import pa_stream_request_cb_t
+
+LENGTH = 1024
+
+
+class PerStreamMeter:
+    """Meter with its own closure, like the former AbstractMonitorableSink."""
+
+    def __init__(self):
+        self.reads = 0
+        self.read_cb = pa_stream_request_cb_t(self._on_stream_read)
+
+    def _on_stream_read(self, _stream, _length, _):
+        self.reads += 1
+
+
+class SlotMeter:
+    """Meter dispatched through the shared trampoline."""
+
+    def __init__(self):
+        self.reads = 0
+
+    def on_stream_read(self, _stream, _length):
+        self.reads += 1
+
+
+def per_stream(count, ticks):
+    """Time ticks rounds of one read callback per stream, own closures."""
+    meters = [PerStreamMeter() for _ in range(count)]
+    callbacks = [meter.read_cb for meter in meters]
+    start = time.perf_counter_ns()
+    for _ in range(ticks):
+        for callback in callbacks:
+            callback(None, LENGTH, None)
+    return time.perf_counter_ns() - start
+
+
+def shared(count, ticks):
+    """Time ticks rounds of one read callback per stream, shared trampoline."""
+    meters = [SlotMeter() for _ in range(count)]
+    slots = []
+    for meter in meters:
+        slots.append(len(streams._read_handlers))
+        streams._read_handlers.append(meter.on_stream_read)
+    callback = streams._READ_CB
+    try:
+        start = time.perf_counter_ns()
+        for _ in range(ticks):
+            for slot in slots:
+                callback(None, LENGTH, slot)
+        return time.perf_counter_ns() - start
+    finally:
+        del streams._read_handlers[slots[0] :]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--streams", type=int, default=50)
+    parser.add_argument("--ticks", type=int, default=20000, help="rounds per run")
+    parser.add_argument("--repeat", type=int, default=5, help="runs, best is kept")
+    args = parser.parse_args()
+
+    calls = args.streams * args.ticks
+    print("{} streams, {} callbacks per run".format(args.streams, calls))
+    results = {}
+    for name, bench in (("per-stream closures", per_stream), ("shared", shared)):
+        best = min(bench(args.streams, args.ticks) for _ in range(args.repeat))
+        results[name] = best
+        print(
+            "{:20s} {:7.1f} ns/callback {:7.1f} us/tick".format(
+                name, best / calls, best / args.ticks / 1000
+            )
+        )
+    before, after = results["per-stream closures"], results["shared"]
+    print("{:20s} {:+6.1f} %".format("change", (after - before) / before * 100))
+
+
+if __name__ == "__main__":
+    main()
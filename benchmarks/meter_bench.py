@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+"""
+Meter frame time
+
+Shows a row of volume sliders with a level meter each and feeds them random
+levels at the meter rate, then measures frame time (frame clock before-paint
+to after-paint) for two implementations:
+
+  scale  Gtk.Scale fill level, updated for every peak (the former meters)
+  meter  ChannelMeter next to a Gtk.Scale, batched through a LevelTable
+
+Needs a desktop session (X11 or Wayland), no PulseAudio.
+
+    python benchmarks/meter_bench.py --meters 50
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+# pylint: disable=wrong-import-position
+import gi
+
+gi.require_version("Gdk", "3.0")
+gi.require_version("Gtk", "3.0")
+from gi.repository import GLib, Gtk
+
+from volctl.meter import ChannelMeter, LevelTable
+
+
+def _slider():
+    scale = Gtk.Scale().new(Gtk.Orientation.VERTICAL)
+    scale.set_range(0.0, 1.0)
+    scale.set_inverted(True)
+    scale.set_size_request(24, 128)
+    scale.set_draw_value(False)
+    scale.set_value(0.7)
+    return scale
+
+
+class ScaleMeters:
+    """Levels shown as Gtk.Scale fill level."""
+
+    def __init__(self, box, count):
+        self._scales = []
+        for _ in range(count):
+            scale = _slider()
+            scale.set_restrict_to_fill_level(False)
+            box.pack_start(scale, False, False, 0)
+            self._scales.append(scale)
+
+    def set_levels(self, levels):
+        """Apply one peak per meter, like the former _update_scale_peak."""
+        for scale, val in zip(self._scales, levels):
+            if val > 0:
+                scale.set_show_fill_level(True)
+                scale.set_fill_level(val)
+            else:
+                scale.set_show_fill_level(False)
+                scale.set_fill_level(0)
+
+
+class ChannelMeters:
+    """Levels shown by ChannelMeter widgets, batched per frame."""
+
+    def __init__(self, box, count):
+        self._table = LevelTable(box)
+        self._meters = []
+        for _ in range(count):
+            meter = ChannelMeter(1)
+            box.pack_start(_slider(), False, False, 0)
+            box.pack_start(meter, False, False, 0)
+            self._meters.append(meter)
+
+    def set_levels(self, levels):
+        """Queue one peak per meter."""
+        for meter, val in zip(self._meters, levels):
+            self._table.set_levels(meter, [val])
+
+
+class Run:
+    """Shows meters, feeds levels and records frame times."""
+
+    def __init__(self, name, kind, args):
+        self._args = args
+        self._frames = []
+        self._frame_start = None
+        self._cpu = 0.0
+        self._feed = None
+        self._loop = GLib.MainLoop()
+        self._rand = random.Random(0)
+
+        self._win = Gtk.Window()
+        self._win.set_title("volctl meter benchmark ({})".format(name))
+        box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=2)
+        self._win.add(box)
+        self._meters = kind(box, args.meters)
+        self._win.connect("map-event", self._cb_mapped)
+        self._win.show_all()
+
+    def run(self):
+        """Run until enough frames were measured, return (frame times, CPU time)."""
+        self._loop.run()
+        return self._frames, self._cpu
+
+    def _cb_mapped(self, *_):
+        clock = self._win.get_frame_clock()
+        clock.connect("before-paint", self._cb_before_paint)
+        clock.connect("after-paint", self._cb_after_paint)
+        self._cpu = time.process_time()
+        self._feed = GLib.timeout_add(self._args.interval, self._cb_feed)
+        return False
+
+    def _cb_feed(self):
+        levels = [self._rand.random() for _ in range(self._args.meters)]
+        self._meters.set_levels(levels)
+        return GLib.SOURCE_CONTINUE
+
+    def _cb_before_paint(self, _clock):
+        self._frame_start = time.perf_counter()
+
+    def _cb_after_paint(self, _clock):
+        if self._frame_start is None:
+            return
+        self._frames.append(time.perf_counter() - self._frame_start)
+        self._frame_start = None
+        if len(self._frames) >= self._args.frames:
+            self._cpu = time.process_time() - self._cpu
+            GLib.Source.remove(self._feed)
+            self._win.destroy()
+            self._loop.quit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--meters", type=int, default=50)
+    parser.add_argument("--frames", type=int, default=600, help="frames per run")
+    parser.add_argument(
+        "--interval", type=int, default=10, help="ms between level updates"
+    )
+    args = parser.parse_args()
+
+    Gtk.init()
+    print("{} meters, {} frames".format(args.meters, args.frames))
+    for name, kind in (("scale", ScaleMeters), ("meter", ChannelMeters)):
+        frames, cpu = Run(name, kind, args).run()
+        frames = sorted(frames)
+        print(
+            "{:6s} frame {:6.2f} ms mean {:6.2f} ms p95  CPU {:5.2f} s".format(
+                name,
+                statistics.mean(frames) * 1000,
+                frames[int(len(frames) * 0.95)] * 1000,
+                cpu,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+"""
+Popup soak test
+
+Opens and closes the slider window many times while a few silent streams
+play into a null sink, sampling RSS and monitor stream/callback counts.
+RSS should level off after warm-up and no streams should be left over once
+the window is closed.
+
+Needs a running PulseAudio (or pipewire-pulse) with pactl and pacat, a
+desktop session with a system tray and the volctl schema (e.g.
+GSETTINGS_SCHEMA_DIR=data after glib-compile-schemas data). Settings are
+kept in memory, user settings are not touched.
+
+    python benchmarks/popup_soak.py --cycles 10000
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+os.environ.setdefault("GSETTINGS_BACKEND", "memory")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+# pylint: disable=wrong-import-position
+import gi
+
+gi.require_version("Gdk", "3.0")
+gi.require_version("GdkX11", "3.0")
+gi.require_version("Gtk", "3.0")
+from gi.repository import Gdk, GLib, Gtk
+
+from volctl.app import VolctlApp
+from volctl.lib.pulseaudio import pa_threaded_mainloop_lock, pa_threaded_mainloop_unlock
+
+SINK_NAME = "volctl_soak"
+
+
+def rss_kib():
+    """Resident set size of this process in KiB."""
+    with open("/proc/self/status") as file:
+        for line in file:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+class NullSink:
+    """Null sink with silent playback streams, removed on exit."""
+
+    def __init__(self, streams):
+        self._streams = streams
+        self._module = None
+        self._players = []
+
+    def __enter__(self):
+        self._module = subprocess.check_output(
+            [
+                "pactl",
+                "load-module",
+                "module-null-sink",
+                "sink_name={}".format(SINK_NAME),
+            ],
+            text=True,
+        ).strip()
+        for _ in range(self._streams):
+            self._players.append(
+                subprocess.Popen(
+                    ["pacat", "--device={}".format(SINK_NAME)],
+                    stdin=open("/dev/zero", "rb"),
+                )
+            )
+        return self
+
+    def __exit__(self, *_):
+        for player in self._players:
+            player.terminate()
+            player.wait()
+        if self._module:
+            subprocess.call(["pactl", "unload-module", self._module])
+
+
+class Soak:
+    """Drives popup/close cycles from the GLib main loop."""
+
+    def __init__(self, app, args):
+        self._app = app
+        self._args = args
+        self._cycle = 0
+        self._shown = False
+        self._rect = None
+        self.samples = []  # (cycle, rss KiB, stream stats)
+        self.failed = False
+
+    def start(self):
+        """Wait for the first PulseAudio update, then start cycling."""
+        GLib.timeout_add(100, self._cb_wait_ready)
+
+    def _sample(self):
+        pa_mgr = self._app.pa_mgr
+        pa_threaded_mainloop_lock(pa_mgr.mainloop)
+        with pa_mgr.meter_lock():
+            stats = pa_mgr.streams.stats()
+        pa_threaded_mainloop_unlock(pa_mgr.mainloop)
+        self.samples.append((self._cycle, rss_kib(), stats))
+        cycle, rss, _ = self.samples[-1]
+        print(
+            "{:6d} cycles  RSS {:7d} KiB  streams {live_streams:3d} live "
+            "{peak_streams:3d} peak  callbacks {live_callbacks:3d} live "
+            "{peak_callbacks:3d} peak".format(cycle, rss, **stats),
+            file=sys.stderr,
+        )
+
+    def _cb_wait_ready(self):
+        if self._app.sliders_win is None:
+            return GLib.SOURCE_CONTINUE
+        display = Gdk.Display.get_default()
+        monitor = display.get_primary_monitor() or display.get_monitor(0)
+        self._rect = monitor.get_workarea()
+        self._sample()
+        GLib.timeout_add(self._args.interval, self._cb_cycle)
+        return GLib.SOURCE_REMOVE
+
+    def _cb_cycle(self):
+        if not self._shown:
+            self._app.show_slider(self._rect)
+            self._shown = True
+            return GLib.SOURCE_CONTINUE
+        self._app.close_slider()
+        self._shown = False
+        self._cycle += 1
+        if self._cycle % self._args.sample_every == 0:
+            self._sample()
+        if self._cycle < self._args.cycles:
+            return GLib.SOURCE_CONTINUE
+        self._finish()
+        return GLib.SOURCE_REMOVE
+
+    def _finish(self):
+        first, last = self.samples[0], self.samples[-1]
+        # RSS after the first sample interval, allocations settle by then
+        warm = self.samples[1] if len(self.samples) > 2 else first
+        growth = last[1] - warm[1]
+        print(
+            "RSS growth after warm-up: {:d} KiB over {:d} cycles".format(
+                growth, last[0] - warm[0]
+            ),
+            file=sys.stderr,
+        )
+        if growth > self._args.max_growth:
+            print("FAIL: RSS keeps growing", file=sys.stderr)
+            self.failed = True
+        for key in ("live_streams", "live_callbacks"):
+            if last[2][key] > first[2][key]:
+                print("FAIL: {} left over".format(key), file=sys.stderr)
+                self.failed = True
+        self._app.quit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--cycles", type=int, default=10000)
+    parser.add_argument("--streams", type=int, default=4, help="silent streams")
+    parser.add_argument("--interval", type=int, default=5, help="ms per half cycle")
+    parser.add_argument("--sample-every", type=int, default=500)
+    parser.add_argument(
+        "--max-growth", type=int, default=2048, help="allowed RSS growth in KiB"
+    )
+    args = parser.parse_args()
+
+    with NullSink(args.streams):
+        Gtk.init()
+        app = VolctlApp()
+        app.settings.set_boolean("vu-enabled", True)
+        app.settings.set_int("warm-up-timeout", 0)
+        soak = Soak(app, args)
+        soak.start()
+        Gtk.main()
+    sys.exit(1 if soak.failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -32,4 +32,5 @@ setup(
         ("share/glib-2.0/schemas", ["data/apps.volctl.gschema.xml"]),
     ],
     install_requires=["click", "pycairo", "PyGObject", "PyYAML"],
+    extras_require={"loudness": ["numpy"], "spectrum": ["numpy"]},
 )
@@ -1,8 +1,10 @@
 """volctl application"""
 
+import os
+import signal
 from subprocess import Popen
 import sys
-from gi.repository import Gdk, Gio, Gtk
+from gi.repository import Gdk, Gio, GLib, Gtk
 
 from volctl.meta import (
     PROGRAM_NAME,
@@ -12,15 +14,24 @@ from volctl.meta import (
     WEBSITE,
     VERSION,
 )
+from volctl.icons import IconResolver
 from volctl.tray import TrayIcon
+from volctl.lib.history import write_csv
+from volctl.lib.loudness import LOUDNESS_AVAILABLE
 from volctl.lib.pa_wrapper import PulseAudioManager
 from volctl.lib.pulseaudio import pa_threaded_mainloop_lock, pa_threaded_mainloop_unlock
 from volctl.prefs import PreferencesDialog
 from volctl.slider_win import VolumeSliders
 from volctl.osd import VolumeOverlay
 
-
 DEFAULT_MIXER_CMD = "pavucontrol"
+# settings the slider window is built with
+SLIDER_WINDOW_KEYS = (
+    "show-percentage",
+    "vu-enabled",
+    "vu-per-channel",
+    "spectrum-enabled",
+)
 
 TOGGLE_BUTTON_CSS = b"""
 button.toggle {
@@ -56,12 +67,22 @@ class VolctlApp:
         self.pa_mgr = PulseAudioManager(self)
 
         # GUI
+        self.icons = IconResolver()
         self.tray_icon = TrayIcon(self)
         self.sliders_win = None
         self._about_win = None
         self._preferences = None
         self._osd = None
         self._mixer_process = None
+        self._warm_up_timeout = None
+        self._main_sink_idx = None  # metered for the live level tray icon
+
+        GLib.unix_signal_add(
+            GLib.PRIORITY_DEFAULT, signal.SIGUSR1, self._cb_dump_history
+        )
+        GLib.unix_signal_add(
+            GLib.PRIORITY_DEFAULT, signal.SIGUSR2, self._cb_print_stats
+        )
 
     def quit(self):
         """Gracefully shut down application."""
@@ -87,29 +108,155 @@ class VolctlApp:
         provider = Gtk.CssProvider()
         provider.load_from_data(TOGGLE_BUTTON_CSS)
         Gtk.StyleContext.add_provider_for_screen(
-            Gdk.Screen.get_default(), provider, Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION,
+            Gdk.Screen.get_default(),
+            provider,
+            Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION,
         )
 
     def _create_osd(self):
         self._osd = VolumeOverlay(self)
         self._osd.connect("destroy", self.on_osd_destroy)
 
+    def _rebuild_osd(self):
+        # OSD is rendered for a fixed scale, recreated on next update
+        if self._osd is not None:
+            self._osd.destroy()
+
     def on_osd_destroy(self, _):
         """OSD window destroy callback."""
         self._osd.disconnect_by_func(self.on_osd_destroy)
         del self._osd
         self._osd = None
 
-    def start_vu(self):
-        if self.settings.get_boolean("vu-enabled"):
-            pa_threaded_mainloop_lock(self.pa_mgr.mainloop)
-            for _, sink in self.pa_mgr.pa_sinks.items():
-                sink.monitor_stream()
-            for _, sink_input in self.pa_mgr.pa_sink_inputs.items():
-                sink_input.monitor_stream()
-            pa_threaded_mainloop_unlock(self.pa_mgr.mainloop)
+    def _vu_needed(self):
+        """
+        Meter streams run while sliders are shown, history is recorded or the
+        tray icon shows the level.
+        """
+        if self.settings.get_boolean("meter-history"):
+            return True
+        if self.settings.get_boolean("tray-level"):
+            return True
+        return self.settings.get_boolean("vu-enabled") and self._sliders_shown()
+
+    def _sliders_shown(self):
+        return self.sliders_win is not None and self.sliders_win.get_visible()
+
+    def start_vu(self, restart=True):
+        """Start meter streams, restart already running ones unless told not to."""
+        if self._vu_needed():
+            self._start_meters(restart)
+
+    def _start_meters(self, restart, corked=False):
+        per_channel = self.settings.get_boolean("vu-per-channel")
+        history = self.settings.get_boolean("meter-history")
+        pa_threaded_mainloop_lock(self.pa_mgr.mainloop)
+        main_sink = self._tray_level_sink()
+        self._main_sink_idx = None if main_sink is None else main_sink.idx
+        # history records everything, otherwise only visible sliders with VU
+        # meters and the tray icon level sink are metered
+        visible = None
+        if not history:
+            visible = set()
+            if (
+                self.sliders_win is not None
+                and self.settings.get_boolean("vu-enabled")
+                and (corked or self._sliders_shown())
+            ):
+                visible.update(self.sliders_win.visible_sinks())
+            if main_sink is not None:
+                visible.add(main_sink)
+        for sinks in (self.pa_mgr.pa_sinks, self.pa_mgr.pa_sink_inputs):
+            for _, sink in sinks.items():
+                if visible is not None and sink not in visible:
+                    sink.stop_monitor_stream()
+                elif restart or not sink.monitored:
+                    # tray icon level is live, never corked
+                    sink.monitor_stream(
+                        per_channel, history, corked and sink is not main_sink
+                    )
+                elif not corked:
+                    sink.uncork_monitor_stream()
+        pa_threaded_mainloop_unlock(self.pa_mgr.mainloop)
+
+    def _tray_level_sink(self):
+        """Sink metered for the live level tray icon, mainloop must be locked."""
+        if self.settings.get_boolean("tray-level"):
+            try:
+                return self.pa_mgr.get_main_sink()
+            except KeyError:
+                pass
+        return None
+
+    def warm_up(self):
+        """
+        Pointer hovers tray icon, prepare for a click.
+
+        Brings the slider window up to date and connects meter streams corked,
+        so a click shows live meters right away. Released after warm-up-timeout.
+        """
+        timeout = self.settings.get_int("warm-up-timeout")
+        if timeout == 0 or self._sliders_shown():
+            return
+        if self._warm_up_timeout is not None:
+            # still warm, just extend
+            GLib.Source.remove(self._warm_up_timeout)
+        else:
+            if self.sliders_win is None:
+                self.sliders_win = VolumeSliders(self)
+            else:
+                self.sliders_win.reconcile_sliders()
+            if self.settings.get_boolean("vu-enabled"):
+                self._start_meters(restart=False, corked=True)
+        self._warm_up_timeout = GLib.timeout_add(timeout, self._cb_warm_up_expired)
+
+    def _cancel_warm_up(self):
+        if self._warm_up_timeout is not None:
+            GLib.Source.remove(self._warm_up_timeout)
+            self._warm_up_timeout = None
+
+    def main_sink_changed(self):
+        """Default sink changed."""
+        self.update_loudness_streams()
+        if self.settings.get_boolean("tray-level"):
+            self.tray_icon.set_level(0.0)
+            self.start_vu(restart=False)
+
+    def update_loudness_streams(self):
+        """Start/stop loudness metering for main sink and selected applications."""
+        enabled = self.settings.get_boolean("loudness-enabled")
+        if enabled and not LOUDNESS_AVAILABLE:
+            print("Loudness metering needs NumPy, disabling it", file=sys.stderr)
+            self.settings.set_boolean("loudness-enabled", False)
+            return
+        apps = self.settings.get_strv("loudness-apps")
+
+        pa_threaded_mainloop_lock(self.pa_mgr.mainloop)
+        main_sink = None
+        if enabled:
+            try:
+                main_sink = self.pa_mgr.get_main_sink()
+            except KeyError:
+                pass
+        for _, sink in self.pa_mgr.pa_sinks.items():
+            if sink is main_sink:
+                sink.monitor_loudness()
+            else:
+                sink.stop_monitor_loudness()
+        for _, sink_input in self.pa_mgr.pa_sink_inputs.items():
+            if enabled and sink_input.app_name in apps:
+                sink_input.monitor_loudness()
+            else:
+                sink_input.stop_monitor_loudness()
+        pa_threaded_mainloop_unlock(self.pa_mgr.mainloop)
+
+    def meter_connection_ready(self):
+        """Separate meter connection is ready, (re-)start meter streams."""
+        self.start_vu()
+        self.update_loudness_streams()
 
     def stop_vu(self):
+        self._main_sink_idx = None
         pa_threaded_mainloop_lock(self.pa_mgr.mainloop)
         for _, sink in self.pa_mgr.pa_sinks.items():
             sink.stop_monitor_stream()
@@ -130,16 +277,27 @@ class VolctlApp:
 
         # tray icon
         self.tray_icon.update_values(volume, mute)
+        if self.sliders_win is None:
+            # prebuilt, so it pops up instantly
+            self.sliders_win = VolumeSliders(self)
 
         # OSD
         if self._first_volume_update:
             # Avoid showing on program start
             self._first_volume_update = False
             return
+        self._show_osd(volume, mute)
+
+    def sink_input_changed(self, volume, mute, name, icon_hints):
+        """Sink input volume or mute changed by another client."""
+        if self.settings.get_boolean("osd-sink-inputs"):
+            self._show_osd(volume, mute, (name, self.icons.resolve(*icon_hints)))
+
+    def _show_osd(self, volume, mute, app=None):
         if self.settings.get_boolean("osd-enabled"):
             if self._osd is None:
                 self._create_osd()
-            self._osd.update_values(volume, mute)
+            self._osd.update_values(volume, mute, app)
         elif self._osd is not None:
             self._osd.destroy()
 
@@ -148,26 +306,118 @@ class VolctlApp:
         if self.sliders_win:
             self.sliders_win.update_sink_scale(idx, volume, mute)
 
-    def update_sink_input_scale(self, idx, volume, mute):
+    def update_sink_input_scale(self, idx, volume, mute, external=True):
         """Notify sink input scale when update is coming from pulseaudio."""
         if self.sliders_win:
-            self.sliders_win.update_sink_input_scale(idx, volume, mute)
+            self.sliders_win.update_sink_input_scale(idx, volume, mute, external)
 
-    def update_sink_peak(self, idx, val):
+    def update_sink_peak(self, idx, vals):
         """Notify sink scale when update is coming from pulseaudio."""
-        if self.sliders_win:
-            self.sliders_win.update_sink_scale_peak(idx, val)
+        if idx == self._main_sink_idx:
+            self.tray_icon.set_level(max(vals))
+        if self._sliders_shown():
+            self.sliders_win.update_sink_scale_peak(idx, vals)
 
-    def update_sink_input_peak(self, idx, val):
+    def update_sink_input_peak(self, idx, vals):
         """Notify sink input scale when update is coming from pulseaudio."""
-        if self.sliders_win:
-            self.sliders_win.update_sink_input_scale_peak(idx, val)
+        if self._sliders_shown():
+            self.sliders_win.update_sink_input_scale_peak(idx, vals)
+
+    def update_sink_loudness(self, idx, reading):
+        """Notify sink scale about new loudness reading."""
+        if self._sliders_shown():
+            self.sliders_win.update_sink_scale_loudness(idx, reading)
+
+    def update_sink_input_loudness(self, idx, reading):
+        """Notify sink input scale about new loudness reading."""
+        if self._sliders_shown():
+            self.sliders_win.update_sink_input_scale_loudness(idx, reading)
 
     def slider_count_changed(self):
         """Amount of sliders changed."""
-        if self.tray_icon and self.tray_icon.initialized and self.sliders_win:
-            self.sliders_win.create_sliders()
-            self.start_vu()
+        self.update_loudness_streams()
+        if self.tray_icon and self.tray_icon.initialized:
+            # keep (hidden) window up to date, so it pops up instantly
+            if self.sliders_win is None:
+                self.sliders_win = VolumeSliders(self)
+            else:
+                self.sliders_win.reconcile_sliders()
+        self.start_vu(restart=False)
+
+    def print_stats(self):
+        """Print monitor stream counts and control operation latency."""
+        pa_threaded_mainloop_lock(self.pa_mgr.mainloop)
+        with self.pa_mgr.meter_lock():
+            stats = self.pa_mgr.streams.stats()
+        latency = self.pa_mgr.pulseaudio.control_latency
+        latency_max = self.pa_mgr.pulseaudio.control_latency_max
+        writes = self.pa_mgr.pulseaudio.control_writes
+        echoes = self.pa_mgr.suppressed_echoes
+        pa_threaded_mainloop_unlock(self.pa_mgr.mainloop)
+        print(
+            "Streams: {live_streams:d} live, {peak_streams:d} peak; "
+            "callback slots: {live_callbacks:d} live, {peak_callbacks:d} peak".format(
+                **stats
+            ),
+            file=sys.stderr,
+        )
+        print(
+            "Control latency: {:.1f} ms average, {:.1f} ms max".format(
+                latency * 1000, latency_max * 1000
+            ),
+            file=sys.stderr,
+        )
+        print(
+            "Control writes: {:d}, own echoes suppressed: {:d}".format(writes, echoes),
+            file=sys.stderr,
+        )
+        if self.sliders_win:
+            print(
+                "Slider reconcile: {:.2f} ms for {:d} streams, {:d} columns".format(
+                    self.sliders_win.reconcile_time * 1000,
+                    self.sliders_win.column_count,
+                    self.sliders_win.widget_columns,
+                ),
+                file=sys.stderr,
+            )
+            print(
+                "Meter updates: {:.3f} ms per frame".format(
+                    self.sliders_win.meter_flush_time * 1000
+                ),
+                file=sys.stderr,
+            )
+            print(
+                "Slider popup: {:.1f} ms last, {:.1f} ms max".format(
+                    self.sliders_win.popup_latency * 1000,
+                    self.sliders_win.popup_latency_max * 1000,
+                ),
+                file=sys.stderr,
+            )
+        if self._osd:
+            print(
+                "OSD draw: {:.3f} ms average, fade: {:.1f} ms CPU average".format(
+                    self._osd.draw_time * 1000, self._osd.fade_cpu * 1000
+                ),
+                file=sys.stderr,
+            )
+            print(
+                "OSD updates: {:d} received, {:d} drawn".format(
+                    self._osd.updates, self._osd.updates_drawn
+                ),
+                file=sys.stderr,
+            )
+        print(
+            "Tray icon updates: {:d}".format(self.tray_icon.icon_updates),
+            file=sys.stderr,
+        )
+
+    def dump_history(self, path):
+        """Write meter history of all streams as CSV file."""
+        pa_threaded_mainloop_lock(self.pa_mgr.mainloop)
+        snapshots = self.pa_mgr.history_snapshots()
+        pa_threaded_mainloop_unlock(self.pa_mgr.mainloop)
+        with open(path, "wt", newline="") as file:
+            write_csv(file, snapshots)
 
     # gsettings callback
 
@@ -176,6 +426,45 @@ class VolctlApp:
             self.mouse_wheel_step = settings.get_int("mouse-wheel-step")
             if self.sliders_win:
                 self.sliders_win.set_increments()
+        elif key in SLIDER_WINDOW_KEYS:
+            self._rebuild_slider_window()
+        elif key == "group-sink-inputs":
+            if self.sliders_win:
+                self.sliders_win.reconcile_sliders()
+                self.start_vu(restart=False)
+        elif key == "osd-scale":
+            self._rebuild_osd()
+        elif key in ("loudness-enabled", "loudness-apps"):
+            self.update_loudness_streams()
+        elif key in ("meter-history", "tray-level"):
+            if self._vu_needed():
+                self.start_vu()
+            else:
+                self.stop_vu()
+
+    def _cb_warm_up_expired(self):
+        self._warm_up_timeout = None
+        if not self._vu_needed():
+            self.stop_vu()
+        else:
+            self.start_vu(restart=False)
+        return GLib.SOURCE_REMOVE
+
+    # signal handler
+
+    def _cb_dump_history(self):
+        if not self.settings.get_boolean("meter-history"):
+            print("Meter history is disabled, nothing written", file=sys.stderr)
+            return GLib.SOURCE_CONTINUE
+        path = os.path.join(GLib.get_user_cache_dir(), "volctl", "meter-history.csv")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.dump_history(path)
+        print("Meter history written to {}".format(path), file=sys.stderr)
+        return GLib.SOURCE_CONTINUE
+
+    def _cb_print_stats(self):
+        self.print_stats()
+        return GLib.SOURCE_CONTINUE
 
     # GUI
 
@@ -217,17 +506,29 @@ class VolctlApp:
             self._mixer_process = Popen(mixer_cmd)
         # TODO: bring mixer win to front otherwise
 
-    def show_slider(self, monitor_rect):
+    def show_slider(self, monitor_rect, start=None):
         """Show mini window with application volume sliders."""
-        self.sliders_win = VolumeSliders(self, monitor_rect)
-        self.start_vu()
+        if self.sliders_win is None:
+            self.sliders_win = VolumeSliders(self)
+        self._cancel_warm_up()
+        self.sliders_win.popup(monitor_rect, start)
+        self.start_vu(restart=False)
 
     def close_slider(self):
         """Close mini window with application volume sliders."""
-        if self.sliders_win:
-            self.sliders_win.destroy()
-            del self.sliders_win
-            self.sliders_win = None
-            self.stop_vu()
+        if self._sliders_shown():
+            self.sliders_win.popdown()
+            if not self._vu_needed():
+                self.stop_vu()
+            else:
+                self.start_vu(restart=False)
             return True
         return False
+
+    def _rebuild_slider_window(self):
+        """Settings the window is built with changed."""
+        if self.sliders_win is None:
+            return
+        self.close_slider()
+        self.sliders_win.destroy()
+        self.sliders_win = VolumeSliders(self)
@@ -0,0 +1,180 @@
+"""
+Icon resolver
+
+Finds icons for streams whose application doesn't set a usable icon name,
+using an index of installed desktop entries keyed by binary name,
+application id and application name. The index is cached on disk and
+rebuilt when an applications directory changes. Pixbufs loaded for custom
+drawing are kept in a small LRU cache, widgets use GTK's own icon loading so
+they stay sharp on HiDPI screens.
+"""
+
+from collections import OrderedDict
+import json
+import os
+import sys
+from gi.repository import Gio, GLib, Gtk
+
+FALLBACK_ICON = "multimedia-volume-control"
+INDEX_VERSION = 1
+
+
+def _application_dirs():
+    data_dirs = [GLib.get_user_data_dir()] + list(GLib.get_system_data_dirs())
+    return [os.path.join(data_dir, "applications") for data_dir in data_dirs]
+
+
+def _dir_mtimes():
+    mtimes = {}
+    for path in _application_dirs():
+        try:
+            mtimes[path] = os.stat(path).st_mtime
+        except OSError:
+            pass
+    return mtimes
+
+
+class IconResolver:
+    """Resolves stream icons and caches their pixbufs."""
+
+    def __init__(self, cache_path=None, max_pixbufs=64):
+        if cache_path is None:
+            cache_path = os.path.join(
+                GLib.get_user_cache_dir(), "volctl", "icon-index.json"
+            )
+        self._cache_path = cache_path
+        self._index = None  # lower-case key -> icon string, built lazily
+        self._resolved = {}
+        self._pixbufs = OrderedDict()  # (icon, size, scale) -> pixbuf or None
+        self._gicons = {}  # icon string -> Gio.Icon
+        self._max_pixbufs = max_pixbufs
+        self._theme = Gtk.IconTheme.get_default()
+        self._theme.connect("changed", self._cb_theme_changed)
+
+    def resolve(self, icon_name, app_id=None, binary=None, app_name=None):
+        """Icon name (or Gio.Icon string) for a stream."""
+        key = (icon_name, app_id, binary, app_name)
+        try:
+            return self._resolved[key]
+        except KeyError:
+            pass
+
+        icon = None
+        if (
+            icon_name is not None
+            and icon_name != FALLBACK_ICON
+            and self._theme.has_icon(icon_name)
+        ):
+            icon = icon_name
+        else:
+            index = self._get_index()
+            for hint in (app_id, binary, app_name):
+                if hint and hint.lower() in index:
+                    icon = index[hint.lower()]
+                    break
+        if icon is None:
+            icon = icon_name or FALLBACK_ICON
+        self._resolved[key] = icon
+        return icon
+
+    def pixbuf(self, icon, size, scale=1):
+        """
+        Pixbuf of icon at size in logical px for a scale factor (so it is
+        size * scale px large), None if not found.
+        """
+        key = (icon, size, scale)
+        try:
+            self._pixbufs.move_to_end(key)
+            return self._pixbufs[key]
+        except KeyError:
+            pass
+
+        pixbuf = None
+        try:
+            info = self._theme.lookup_by_gicon_for_scale(
+                self.gicon(icon), size, scale, Gtk.IconLookupFlags.FORCE_SIZE
+            )
+            if info is not None:
+                pixbuf = info.load_icon()
+        except GLib.Error:
+            pass
+        self._pixbufs[key] = pixbuf
+        if len(self._pixbufs) > self._max_pixbufs:
+            self._pixbufs.popitem(last=False)
+        return pixbuf
+
+    def gicon(self, icon):
+        """Gio.Icon for an icon name or Gio.Icon string."""
+        try:
+            return self._gicons[icon]
+        except KeyError:
+            pass
+        try:
+            gicon = Gio.Icon.new_for_string(icon)
+        except GLib.Error:
+            gicon = Gio.ThemedIcon.new(FALLBACK_ICON)
+        if isinstance(gicon, Gio.ThemedIcon):
+            gicon.append_name(FALLBACK_ICON)  # used if the theme lacks icon
+        self._gicons[icon] = gicon
+        return gicon
+
+    def set_image(self, image, icon, icon_size):
+        """Show icon in Gtk.Image with given Gtk.IconSize."""
+        # GTK loads the icon for the widget's scale factor
+        image.set_from_gicon(self.gicon(icon), icon_size)
+
+    def _get_index(self):
+        if self._index is None:
+            mtimes = _dir_mtimes()
+            self._index = self._load_index(mtimes)
+            if self._index is None:
+                self._index = self._build_index()
+                self._save_index(mtimes)
+        return self._index
+
+    def _load_index(self, mtimes):
+        try:
+            with open(self._cache_path) as file:
+                cache = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if cache.get("version") != INDEX_VERSION or cache.get("mtimes") != mtimes:
+            return None
+        return cache.get("index")
+
+    def _save_index(self, mtimes):
+        try:
+            os.makedirs(os.path.dirname(self._cache_path), exist_ok=True)
+            with open(self._cache_path, "w") as file:
+                json.dump(
+                    {"version": INDEX_VERSION, "mtimes": mtimes, "index": self._index},
+                    file,
+                )
+        except OSError as err:
+            print("Could not write icon index: {}".format(err), file=sys.stderr)
+
+    @staticmethod
+    def _build_index():
+        index = {}
+        for app_info in Gio.AppInfo.get_all():
+            icon = app_info.get_icon()
+            if icon is None:
+                continue
+            icon = icon.to_string()
+            keys = [app_info.get_name()]
+            app_id = app_info.get_id()
+            if app_id and app_id.endswith(".desktop"):
+                keys.append(app_id[: -len(".desktop")])
+            executable = app_info.get_executable()
+            if executable:
+                keys.append(os.path.basename(executable))
+            if isinstance(app_info, Gio.DesktopAppInfo):
+                keys.append(app_info.get_startup_wm_class())
+            for key in keys:
+                if key:
+                    index.setdefault(key.lower(), icon)
+        return index
+
+    def _cb_theme_changed(self, _):
+        self._resolved.clear()
+        self._pixbufs.clear()
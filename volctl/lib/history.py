@@ -0,0 +1,83 @@
+"""
+Meter history.
+
+Fixed-size ring buffers of meter levels and peak-hold ballistics, so recent
+levels can be inspected after the fact (e.g. to find out when audio clipped).
+"""
+
+from array import array
+import csv
+from datetime import datetime, timedelta
+import time
+
+HISTORY_SECONDS = 300
+PEAK_FALLOFF = 0.02  # peak-hold fall per record
+
+
+class MeterHistory:
+    """Ring buffer of (timestamp, level, peak-hold) records.
+
+    Storage is allocated once, recording only overwrites slots.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._times = array("d", bytes(8 * capacity))
+        self._levels = array("f", bytes(4 * capacity))
+        self._peaks = array("f", bytes(4 * capacity))
+        self._pos = 0
+        self._count = 0
+        self._peak = 0.0
+
+    def __len__(self):
+        return self._count
+
+    def record(self, timestamp, level):
+        """Record level (0.0 - 1.0) at monotonic timestamp."""
+        if level >= self._peak:
+            self._peak = level
+        else:
+            self._peak = max(level, self._peak - PEAK_FALLOFF)
+        pos = self._pos
+        self._times[pos] = timestamp
+        self._levels[pos] = level
+        self._peaks[pos] = self._peak
+        self._pos = (pos + 1) % self.capacity
+        if self._count < self.capacity:
+            self._count += 1
+
+    def snapshot(self):
+        """Copy of records, oldest first, as (times, levels, peaks) arrays."""
+        start = (self._pos - self._count) % self.capacity
+        if start + self._count <= self.capacity:
+            end = start + self._count
+            return (
+                self._times[start:end],
+                self._levels[start:end],
+                self._peaks[start:end],
+            )
+        end = self._pos
+        return (
+            self._times[start:] + self._times[:end],
+            self._levels[start:] + self._levels[:end],
+            self._peaks[start:] + self._peaks[:end],
+        )
+
+
+def write_csv(file, snapshots):
+    """Write history snapshots (name -> snapshot) as CSV with wall clock times."""
+    now_mono = time.monotonic()
+    now = datetime.now()
+    writer = csv.writer(file)
+    writer.writerow(["stream", "time", "level", "peak"])
+    for name, (times, levels, peaks) in snapshots.items():
+        for timestamp, level, peak in zip(times, levels, peaks):
+            wall = now - timedelta(seconds=now_mono - timestamp)
+            writer.writerow(
+                [
+                    name,
+                    wall.isoformat(timespec="milliseconds"),
+                    "%.4f" % level,
+                    "%.4f" % peak,
+                ]
+            )
@@ -0,0 +1,218 @@
+"""
+EBU R128 / ITU-R BS.1770 loudness metering.
+
+Consumes interleaved float32 audio and computes momentary, short-term and
+integrated loudness (LUFS) plus true peak (dBTP). Needs NumPy, which is an
+optional dependency.
+
+K-weighting is applied in the frequency domain: the weighted mean square of a
+100 ms sub-block equals its power spectrum multiplied with the squared
+magnitude response of the K-weighting filter (Parseval), so each sub-block is
+reduced with a single batched FFT instead of a sample-by-sample IIR filter.
+"""
+
+from collections import namedtuple
+import math
+
+try:
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+except ImportError:
+    np = None
+
+LOUDNESS_AVAILABLE = np is not None
+
+RATE = 48000  # in Hz
+BLOCK_SIZE = RATE // 10  # 100 ms sub-blocks
+MOMENTARY_BLOCKS = 4  # 400 ms
+SHORT_TERM_BLOCKS = 30  # 3 s
+ABSOLUTE_GATE = -70.0  # in LUFS
+RELATIVE_GATE = -10.0  # in LU
+HISTOGRAM_MAX = 10.0  # in LUFS
+HISTOGRAM_STEP = 0.1  # in LU
+TRUE_PEAK_OVERSAMPLING = 4
+TRUE_PEAK_TAPS = 12  # per phase
+
+# ITU-R BS.1770-4 K-weighting filter coefficients at 48 kHz (b, a)
+K_SHELF = (
+    (1.53512485958697, -2.69169618940638, 1.19839281085285),
+    (1.0, -1.69065929318241, 0.73248077421585),
+)
+K_HIGHPASS = (
+    (1.0, -2.0, 1.0),
+    (1.0, -1.99004745483398, 0.99007225036621),
+)
+
+LoudnessReading = namedtuple(
+    "LoudnessReading", ["momentary", "short_term", "integrated", "true_peak"]
+)
+
+
+def _energy_to_lufs(energy):
+    if energy <= 0:
+        return -math.inf
+    return -0.691 + 10 * math.log10(energy)
+
+
+def _biquad_power_response(coeffs, freqs):
+    """Squared magnitude response of a biquad at normalized angular freqs."""
+    b_coeffs, a_coeffs = coeffs
+    z_inv = np.exp(-1j * freqs)
+    num = b_coeffs[0] + b_coeffs[1] * z_inv + b_coeffs[2] * z_inv ** 2
+    den = a_coeffs[0] + a_coeffs[1] * z_inv + a_coeffs[2] * z_inv ** 2
+    return np.abs(num / den) ** 2
+
+
+def _k_weighting_gains():
+    """Per-rfft-bin gains that turn a block power spectrum into mean square."""
+    bins = BLOCK_SIZE // 2 + 1
+    freqs = np.linspace(0, np.pi, bins)
+    gains = _biquad_power_response(K_SHELF, freqs) * _biquad_power_response(
+        K_HIGHPASS, freqs
+    )
+    # one-sided spectrum: all bins but DC and Nyquist appear twice
+    gains[1:-1] *= 2
+    return gains / BLOCK_SIZE ** 2
+
+
+def _true_peak_phases():
+    """Polyphase interpolation filter, shape (taps, phases)."""
+    taps = TRUE_PEAK_TAPS * TRUE_PEAK_OVERSAMPLING
+    pos = (np.arange(taps) - (taps - 1) / 2) / TRUE_PEAK_OVERSAMPLING
+    coeffs = np.sinc(pos) * np.kaiser(taps, 5.0)
+    coeffs *= TRUE_PEAK_OVERSAMPLING / coeffs.sum()
+    # rows are ordered oldest to newest sample to match sliding windows
+    return coeffs.reshape(TRUE_PEAK_TAPS, TRUE_PEAK_OVERSAMPLING)[::-1].copy()
+
+
+class LoudnessMeter:
+    """
+    Loudness meter for one interleaved float32 stream at 48 kHz.
+
+    Memory use is fixed: sub-block energies live in a ring buffer covering the
+    short-term window and integrated loudness is gated from a histogram of
+    400 ms block loudness values.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, weights):
+        if not LOUDNESS_AVAILABLE:
+            raise RuntimeError("Loudness metering needs NumPy")
+        self.channels = len(weights)
+        self._weights = np.asarray(weights, dtype=np.float64)
+        self._k_gains = _k_weighting_gains()
+        self._tp_phases = _true_peak_phases()
+
+        self._pending = np.zeros((BLOCK_SIZE, self.channels), dtype=np.float32)
+        self._pending_len = 0
+        self._tp_history = np.zeros(
+            (TRUE_PEAK_TAPS - 1, self.channels), dtype=np.float32
+        )
+
+        self._energies = np.zeros(SHORT_TERM_BLOCKS)
+        self._energy_pos = 0
+        hist_bins = int(round((HISTOGRAM_MAX - ABSOLUTE_GATE) / HISTOGRAM_STEP)) + 1
+        self._hist_lufs = ABSOLUTE_GATE + np.arange(hist_bins) * HISTOGRAM_STEP
+        self._hist_count = np.zeros(hist_bins, dtype=np.int64)
+        self._hist_energy = np.zeros(hist_bins)
+        self.blocks = 0
+        self._true_peak = 0.0
+
+    def reset(self):
+        """Start a new measurement."""
+        self._pending_len = 0
+        self._tp_history.fill(0)
+        self._energies.fill(0)
+        self._energy_pos = 0
+        self._hist_count.fill(0)
+        self._hist_energy.fill(0)
+        self.blocks = 0
+        self._true_peak = 0.0
+
+    def process(self, data):
+        """Feed interleaved float32 samples (bytes-like, native endianness)."""
+        frames = np.frombuffer(data, dtype=np.float32)
+        frames = frames[: len(frames) - len(frames) % self.channels]
+        frames = frames.reshape(-1, self.channels)
+        if not frames.size:
+            return
+        self._update_true_peak(frames)
+
+        pos = 0
+        while pos < len(frames):
+            count = min(BLOCK_SIZE - self._pending_len, len(frames) - pos)
+            self._pending[self._pending_len : self._pending_len + count] = frames[
+                pos : pos + count
+            ]
+            self._pending_len += count
+            pos += count
+            if self._pending_len == BLOCK_SIZE:
+                self._finish_block()
+                self._pending_len = 0
+
+    def reading(self):
+        """Current loudness values."""
+        return LoudnessReading(
+            self.momentary, self.short_term, self.integrated, self.true_peak
+        )
+
+    @property
+    def momentary(self):
+        """Momentary loudness (400 ms) in LUFS."""
+        return _energy_to_lufs(self._window_energy(MOMENTARY_BLOCKS))
+
+    @property
+    def short_term(self):
+        """Short-term loudness (3 s) in LUFS."""
+        return _energy_to_lufs(self._window_energy(SHORT_TERM_BLOCKS))
+
+    @property
+    def integrated(self):
+        """Gated integrated loudness in LUFS."""
+        count = self._hist_count.sum()
+        if not count:
+            return -math.inf
+        threshold = _energy_to_lufs(self._hist_energy.sum() / count) + RELATIVE_GATE
+        gated = self._hist_lufs >= threshold - HISTOGRAM_STEP / 2
+        count = self._hist_count[gated].sum()
+        if not count:
+            return -math.inf
+        return _energy_to_lufs(self._hist_energy[gated].sum() / count)
+
+    @property
+    def true_peak(self):
+        """Maximum true peak in dBTP."""
+        if self._true_peak <= 0:
+            return -math.inf
+        return 20 * math.log10(self._true_peak)
+
+    def _window_energy(self, blocks):
+        if self.blocks < blocks:
+            return 0.0
+        idx = np.arange(self._energy_pos - blocks, self._energy_pos)
+        return self._energies.take(idx, mode="wrap").mean()
+
+    def _finish_block(self):
+        power = np.abs(np.fft.rfft(self._pending, axis=0)) ** 2
+        mean_squares = self._k_gains @ power
+        self._energies[self._energy_pos] = mean_squares @ self._weights
+        self._energy_pos = (self._energy_pos + 1) % SHORT_TERM_BLOCKS
+        self.blocks += 1
+
+        # gating blocks of 400 ms with 75 % overlap
+        energy = self._window_energy(MOMENTARY_BLOCKS)
+        lufs = _energy_to_lufs(energy)
+        if lufs >= ABSOLUTE_GATE:
+            hist_bin = min(
+                int((lufs - ABSOLUTE_GATE) / HISTOGRAM_STEP), len(self._hist_count) - 1
+            )
+            self._hist_count[hist_bin] += 1
+            self._hist_energy[hist_bin] += energy
+
+    def _update_true_peak(self, frames):
+        padded = np.concatenate((self._tp_history, frames))
+        windows = sliding_window_view(padded, TRUE_PEAK_TAPS, axis=0)
+        peak = float(np.abs(windows @ self._tp_phases).max())
+        self._true_peak = max(self._true_peak, peak)
+        self._tp_history[:] = padded[-(TRUE_PEAK_TAPS - 1) :]
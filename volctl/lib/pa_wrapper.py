@@ -4,10 +4,16 @@ PulseAudio manager.
 Interacts with auto-generated lib_pulseaudio ctypes bindings.
 """
 
+from collections import deque
+from contextlib import contextmanager
 import sys
-from ctypes import cast, c_void_p, c_ubyte, c_ulong, POINTER
+import time
+from ctypes import c_void_p, c_ulong, string_at
 from gi.repository import GObject
 
+from volctl.lib import loudness, spectrum
+from volctl.lib.history import HISTORY_SECONDS, MeterHistory
+from volctl.lib.streams import StreamManager
 from volctl.lib.pulseaudio import (
     # types
     pa_cvolume,
@@ -20,13 +26,18 @@ from volctl.lib.pulseaudio import (
     pa_server_info_cb_t,
     pa_sink_input_info_cb_t,
     pa_context_success_cb_t,
-    pa_stream_request_cb_t,
     pa_sample_spec,
+    pa_channel_map,
+    pa_buffer_attr,
     # mainloop
     pa_threaded_mainloop_new,
     pa_threaded_mainloop_get_api,
     pa_threaded_mainloop_start,
     pa_threaded_mainloop_signal,
+    pa_threaded_mainloop_lock,
+    pa_threaded_mainloop_unlock,
+    pa_threaded_mainloop_in_thread,
+    pa_threaded_mainloop_stop,
     # context
     pa_context_new,
     pa_context_connect,
@@ -47,21 +58,18 @@ from volctl.lib.pulseaudio import (
     pa_context_set_sink_input_volume,
     pa_context_set_sink_input_mute,
     # misc
+    pa_channel_map_init_extend,
     pa_operation_unref,
     pa_proplist_to_string,
     # stream monitoring
-    pa_stream_connect_record,
-    pa_stream_new,
-    pa_stream_set_monitor_stream,
-    pa_stream_set_read_callback,
     pa_stream_peek,
     pa_stream_drop,
-    pa_stream_disconnect,
     # constants
     PA_CONTEXT_READY,
     PA_SUBSCRIPTION_MASK_SINK,
     PA_SUBSCRIPTION_MASK_SINK_INPUT,
     PA_SUBSCRIPTION_MASK_CLIENT,
+    PA_SUBSCRIPTION_MASK_SERVER,
     PA_CONTEXT_FAILED,
     PA_CONTEXT_TERMINATED,
     PA_SUBSCRIPTION_EVENT_FACILITY_MASK,
@@ -70,13 +78,38 @@ from volctl.lib.pulseaudio import (
     PA_SUBSCRIPTION_EVENT_SINK,
     PA_SUBSCRIPTION_EVENT_TYPE_MASK,
     PA_SUBSCRIPTION_EVENT_SINK_INPUT,
+    PA_SUBSCRIPTION_EVENT_SERVER,
+    PA_CHANNEL_MAP_DEFAULT,
+    PA_CHANNEL_POSITION_LFE,
+    PA_CHANNEL_POSITION_REAR_LEFT,
+    PA_CHANNEL_POSITION_REAR_RIGHT,
+    PA_CHANNEL_POSITION_SIDE_LEFT,
+    PA_CHANNEL_POSITION_SIDE_RIGHT,
+    PA_SAMPLE_FLOAT32BE,
+    PA_SAMPLE_FLOAT32LE,
     PA_SAMPLE_U8,
     PA_STREAM_ADJUST_LATENCY,
     PA_STREAM_DONT_MOVE,
     PA_STREAM_PEAK_DETECT,
+    PA_STREAM_START_CORKED,
 )
 
 METER_RATE = 25  # in Hz
+METER_MAX_CHANNELS = 8
+ECHO_TIMEOUT = 1.0  # max. time in sec until the server reports our own write
+ECHO_UNCHANGED = -1  # _consume_echo result for updates not touching volume/mute
+FLOAT32_SAMPLE_FORMAT = (
+    PA_SAMPLE_FLOAT32LE if sys.byteorder == "little" else PA_SAMPLE_FLOAT32BE
+)
+SPECTRUM_FRAGMENT_SIZE = spectrum.RATE // 50 * 4  # 20 ms of mono float32
+# ITU-R BS.1770 channel weights, unlisted positions are weighted 1.0
+LOUDNESS_CHANNEL_WEIGHTS = {
+    PA_CHANNEL_POSITION_LFE: 0.0,
+    PA_CHANNEL_POSITION_REAR_LEFT: 1.41,
+    PA_CHANNEL_POSITION_REAR_RIGHT: 1.41,
+    PA_CHANNEL_POSITION_SIDE_LEFT: 1.41,
+    PA_CHANNEL_POSITION_SIDE_RIGHT: 1.41,
+}
 
 
 def cvolume_from_volume(volume, channels):
@@ -90,6 +123,25 @@ def cvolume_from_volume(volume, channels):
     return cvolume
 
 
+def record_buffer_attr(fragsize):
+    """Buffer attributes for a record stream with given fragment size."""
+    buffer_attr = pa_buffer_attr()
+    buffer_attr.maxlength = 0xFFFFFFFF
+    buffer_attr.tlength = 0xFFFFFFFF
+    buffer_attr.prebuf = 0xFFFFFFFF
+    buffer_attr.minreq = 0xFFFFFFFF
+    buffer_attr.fragsize = fragsize
+    return buffer_attr
+
+
+def loudness_weights(channel_map):
+    """BS.1770 channel weights for a channel map."""
+    return [
+        LOUDNESS_CHANNEL_WEIGHTS.get(channel_map.map[i], 1.0)
+        for i in range(channel_map.channels)
+    ]
+
+
 class PulseAudio:
     """Handles connection to PA. Sets up callbacks."""
 
@@ -104,8 +156,10 @@ class PulseAudio:
         new_sink_input_cb,
         remove_sink_input_cb,
         default_sink_cb,
+        meter_ready_cb,
+        meter_connection="shared",
     ):
-        # pylint: disable=too-many-arguments
+        # pylint: disable=too-many-arguments,too-many-locals
 
         self.new_client_cb = new_client_cb
         self.new_sink_input_cb = new_sink_input_cb
@@ -114,6 +168,11 @@ class PulseAudio:
         self.new_sink_cb = new_sink_cb
         self.remove_sink_cb = remove_sink_cb
         self.default_sink_cb = default_sink_cb
+        self.meter_ready_cb = meter_ready_cb
+        self._control_sent = deque()
+        self.control_latency = 0.0  # moving average in seconds
+        self.control_latency_max = 0.0
+        self.control_writes = 0
 
         self.pa_mainloop = pa_threaded_mainloop_new()
         self.pa_mainloop_api = pa_threaded_mainloop_get_api(self.pa_mainloop)
@@ -123,8 +182,29 @@ class PulseAudio:
         pa_context_set_state_callback(self.context, self.__context_notify_cb, None)
         pa_context_connect(self.context, None, 0, None)
 
+        # Meter streams may use their own connection (and thread), so control
+        # operations don't queue behind meter traffic.
+        self.meter_mainloop = None
+        self.meter_context = self.context
+        if meter_connection in ("context", "thread"):
+            meter_api = self.pa_mainloop_api
+            if meter_connection == "thread":
+                self.meter_mainloop = pa_threaded_mainloop_new()
+                meter_api = pa_threaded_mainloop_get_api(self.meter_mainloop)
+            self.meter_context = pa_context_new(
+                meter_api, "volctl meters".encode("utf-8")
+            )
+            self.__meter_context_notify_cb = pa_context_notify_cb_t(
+                self._meter_context_notify_cb
+            )
+            pa_context_set_state_callback(
+                self.meter_context, self.__meter_context_notify_cb, None
+            )
+            pa_context_connect(self.meter_context, None, 0, None)
+
         # create callbacks
         self.__null_cb = pa_context_success_cb_t(self._null_cb)
+        self.__control_cb = pa_context_success_cb_t(self._control_cb)
         self.__pa_sink_info_cb = pa_sink_info_cb_t(self._pa_sink_info_cb)
         self.__pa_context_subscribe_cb = pa_context_subscribe_cb_t(
             self._pa_context_subscribe_cb
@@ -136,39 +216,64 @@ class PulseAudio:
         self.__pa_server_info_cb = pa_server_info_cb_t(self._pa_server_info_cb)
 
         pa_threaded_mainloop_start(self.pa_mainloop)
+        if self.meter_mainloop is not None:
+            pa_threaded_mainloop_start(self.meter_mainloop)
 
     def set_sink_volume(self, index, cvolume):
         """Set volume for a sink by index."""
+        self.control_writes += 1
+        self._control_sent.append(time.monotonic())
         operation = pa_context_set_sink_volume_by_index(
-            self.context, index, cvolume, self.__null_cb, None
+            self.context, index, cvolume, self.__control_cb, None
         )
         pa_operation_unref(operation)
 
     def set_sink_mute(self, index, mute):
         """Set mute for a sink by index."""
+        self.control_writes += 1
+        self._control_sent.append(time.monotonic())
         operation = pa_context_set_sink_mute_by_index(
-            self.context, index, mute, self.__null_cb, None
+            self.context, index, mute, self.__control_cb, None
         )
         pa_operation_unref(operation)
 
     def set_sink_input_volume(self, index, cvolume):
         """Set mute for a sink input by index."""
+        self.control_writes += 1
+        self._control_sent.append(time.monotonic())
         operation = pa_context_set_sink_input_volume(
-            self.context, index, cvolume, self.__null_cb, None
+            self.context, index, cvolume, self.__control_cb, None
         )
         pa_operation_unref(operation)
 
     def set_sink_input_mute(self, index, mute):
         """Set mute for a sink input by index."""
+        self.control_writes += 1
+        self._control_sent.append(time.monotonic())
         operation = pa_context_set_sink_input_mute(
-            self.context, index, mute, self.__null_cb, None
+            self.context, index, mute, self.__control_cb, None
         )
         pa_operation_unref(operation)
 
     def disconnect(self):
         """Terminate connection to PA."""
+        if self.meter_context is not self.context:
+            if self.meter_mainloop is not None:
+                pa_threaded_mainloop_lock(self.meter_mainloop)
+            pa_context_disconnect(self.meter_context)
+            if self.meter_mainloop is not None:
+                pa_threaded_mainloop_unlock(self.meter_mainloop)
+                pa_threaded_mainloop_stop(self.meter_mainloop)
         pa_context_disconnect(self.context)
 
+    def _meter_context_notify_cb(self, context, userdata):
+        state = pa_context_get_state(context)
+        if state == PA_CONTEXT_READY:
+            print("PulseAudio: Meter connection ready", file=sys.stderr)
+            GObject.idle_add(self.meter_ready_cb)
+        elif state == PA_CONTEXT_FAILED:
+            print("PulseAudio: Meter connection failed", file=sys.stderr)
+
     def _context_notify_cb(self, context, userdata):
         state = pa_context_get_state(context)
 
@@ -182,6 +287,7 @@ class PulseAudio:
                 PA_SUBSCRIPTION_MASK_SINK
                 | PA_SUBSCRIPTION_MASK_SINK_INPUT
                 | PA_SUBSCRIPTION_MASK_CLIENT
+                | PA_SUBSCRIPTION_MASK_SERVER
             )
             operation = pa_context_subscribe(
                 self.context, submask, self.__null_cb, None
@@ -249,6 +355,13 @@ class PulseAudio:
                 )
                 pa_operation_unref(operation)
 
+        elif efac == PA_SUBSCRIPTION_EVENT_SERVER:
+            # e.g. default sink changed
+            operation = pa_context_get_server_info(
+                self.context, self.__pa_server_info_cb, None
+            )
+            pa_operation_unref(operation)
+
     def _pa_client_info_cb(self, context, struct, c_int, user_data):
         if struct:
             self.new_client_cb(
@@ -281,6 +394,13 @@ class PulseAudio:
     def _null_cb(param_a=None, param_b=None, param_c=None, param_d=None):
         return
 
+    def _control_cb(self, context, success, userdata):
+        # operations on a context complete in order
+        if self._control_sent:
+            latency = time.monotonic() - self._control_sent.popleft()
+            self.control_latency = 0.9 * self.control_latency + 0.1 * latency
+            self.control_latency_max = max(self.control_latency_max, latency)
+
     @staticmethod
     def _dict_from_proplist(proplist):
         props = {}
@@ -314,18 +434,42 @@ class PulseAudioManager:
             self._on_new_pa_sink_input,
             self._on_remove_pa_sink_input,
             self._on_default_sink,
+            self.volctl.meter_connection_ready,
+            self.volctl.settings.get_string("meter-connection"),
         )
         self.context = self._pulseaudio.context
-        self.samplespec = pa_sample_spec()
-        self.samplespec.channels = 1
-        self.samplespec.format = PA_SAMPLE_U8
-        self.samplespec.rate = METER_RATE
+        self.meter_context = self._pulseaudio.meter_context
+        self.streams = StreamManager()
+        self._samplespecs = {}
+        self.suppressed_echoes = 0
 
     @property
     def mainloop(self):
         """Get PulseAudio mainloop."""
         return self._pulseaudio.pa_mainloop
 
+    @property
+    def pulseaudio(self):
+        """Get PulseAudio connection."""
+        return self._pulseaudio
+
+    @contextmanager
+    def meter_lock(self):
+        """Lock meter mainloop if meters run in their own thread.
+
+        Callers must hold the main mainloop lock (or be in its thread), so
+        locks are always taken in the same order.
+        """
+        mainloop = self._pulseaudio.meter_mainloop
+        if mainloop is None or pa_threaded_mainloop_in_thread(mainloop):
+            yield
+        else:
+            pa_threaded_mainloop_lock(mainloop)
+            try:
+                yield
+            finally:
+                pa_threaded_mainloop_unlock(mainloop)
+
     @property
     def pa_sinks(self):
         """Get PulseAudio sinks."""
@@ -336,12 +480,43 @@ class PulseAudioManager:
         """Get PulseAudio sink inputs."""
         return self._pa_sink_inputs
 
+    def get_samplespec(self, channels, sample_format=PA_SAMPLE_U8, rate=METER_RATE):
+        """Return (cached) meter sample spec."""
+        key = (channels, sample_format, rate)
+        try:
+            return self._samplespecs[key]
+        except KeyError:
+            samplespec = pa_sample_spec()
+            samplespec.channels = channels
+            samplespec.format = sample_format
+            samplespec.rate = rate
+            self._samplespecs[key] = samplespec
+            return samplespec
+
+    def history_snapshots(self):
+        """Meter history snapshots by stream description."""
+        snapshots = {}
+        with self.meter_lock():
+            for kind, sinks in (
+                ("sink", self._pa_sinks),
+                ("app", self._pa_sink_inputs),
+            ):
+                for idx, sink in sinks.items():
+                    if sink.history is not None and len(sink.history):
+                        name = "{} #{:d}: {}".format(kind, idx, sink.name)
+                        snapshots[name] = sink.history.snapshot()
+        return snapshots
+
     def get_pa_client(self, client):
         """Return PulseAudio client."""
         return self._pa_clients[client]
 
     def close(self):
         """Close PA manager."""
+        pa_threaded_mainloop_lock(self.mainloop)
+        with self.meter_lock():
+            self.streams.release_all()
+        pa_threaded_mainloop_unlock(self.mainloop)
         self._pulseaudio.disconnect()
 
     # called by Sink, SinkInput objects
@@ -420,7 +595,8 @@ class PulseAudioManager:
 
     def _on_remove_pa_sink(self, index):
         sink = self._pa_sinks.pop(index)
-        del self._pa_sink_index_by_name[sink.sink_name]
+        sink.stop_monitor_streams()
+        del self._pa_sinks_by_name[sink.sink_name]
         GObject.idle_add(self.volctl.slider_count_changed)
 
     def _on_new_pa_sink_input(self, index, struct, props):
@@ -440,11 +616,18 @@ class PulseAudioManager:
 
     def _on_remove_pa_sink_input(self, index):
         if index in self._pa_sink_inputs:
-            del self._pa_sink_inputs[index]
+            self._pa_sink_inputs.pop(index).stop_monitor_streams()
             GObject.idle_add(self.volctl.slider_count_changed)
 
     def _on_default_sink(self, name):
+        # server events aren't only sent for default sink changes
+        if name == self._default_sink:
+            return
         self._default_sink = name
+        GObject.idle_add(self.volctl.main_sink_changed)
+        sink = self._pa_sinks_by_name.get(name)
+        if sink is not None:
+            GObject.idle_add(self.volctl.update_values, sink.volume, sink.mute)
 
 class AbstractMonitorableSink:
     """Base class for Sinks."""
@@ -457,15 +640,58 @@ class AbstractMonitorableSink:
         self.mute = False
         self._icon_name = None
         self._name = ""
-        self._stream = None
-        self._on_stream_read_ctypes = pa_stream_request_cb_t(self._on_stream_read)
+        # hints for icon lookup
+        self.app_name = None
+        self.app_id = None
+        self.app_binary = None
+        self._streams = {}  # stream name -> StreamManager slot
+        self._channel_map = pa_channel_map()
+        self._meter_channels = 1
+        self._peak_corked = False
+        self.history = None
+        self.loudness = None
+        self._spectrum = None
         self._is_sink_input = isinstance(self, SinkInput)
+        # (time, volume, mute) after each of our writes, oldest first
+        self._pending_writes = deque()
+        self._server_state = None  # (volume, mute) of the last update
 
     def update(self, struct, _):
         """Update sink properties."""
         self.volume = struct.volume.values[0]
         self.channels = struct.volume.channels
         self.mute = bool(struct.mute)
+        self._channel_map = pa_channel_map.from_buffer_copy(struct.channel_map)
+
+    def _expect_echo(self):
+        """Remember state written to the server."""
+        self._pending_writes.append((time.monotonic(), self.volume, self.mute))
+
+    def _consume_echo(self):
+        """
+        Match current state against our in-flight writes.
+
+        Returns ECHO_UNCHANGED if volume and mute are the same as in the last
+        update (other properties changed, or a duplicate event), None for an
+        external change, else the number of writes still in flight (0 if the
+        echo of the latest write arrived).
+        """
+        state = (self.volume, self.mute)
+        if state == self._server_state:
+            return ECHO_UNCHANGED
+        self._server_state = state
+        pending = self._pending_writes
+        expired = time.monotonic() - ECHO_TIMEOUT
+        while pending and pending[0][0] < expired:
+            pending.popleft()
+        for i, (_, volume, mute) in enumerate(pending):
+            if volume == self.volume and mute == self.mute:
+                for _ in range(i + 1):
+                    pending.popleft()
+                self.pa_mgr.suppressed_echoes += 1
+                return len(pending)
+        # writes still in flight are left to expire
+        return None
 
     @property
     def name(self):
@@ -482,39 +708,185 @@ class AbstractMonitorableSink:
         """Sink index"""
         return self.idx
 
-    def monitor_stream(self):
-        if self._stream is not None:
-            pa_stream_disconnect(self._stream)
+    def get_meter_channels(self, per_channel):
+        """Number of channels metered (1 unless per-channel metering is used)."""
+        if per_channel:
+            return max(1, min(self.channels, METER_MAX_CHANNELS))
+        return 1
 
-        self._stream = pa_stream_new(
-            self.pa_mgr.context, "peak".encode("utf-8"), self.pa_mgr.samplespec, None,
-        )
-        pa_stream_set_read_callback(self._stream, self._on_stream_read_ctypes, None)
-        if self._is_sink_input:
-            pa_stream_set_monitor_stream(self._stream, self.idx)
-        pa_stream_connect_record(
-            self._stream,
-            "{:d}".format(self.sink_idx).encode("utf-8"),
-            None,
-            PA_STREAM_DONT_MOVE | PA_STREAM_PEAK_DETECT | PA_STREAM_ADJUST_LATENCY,
+    @property
+    def monitored(self):
+        """Whether the peak meter stream is running."""
+        return "peak" in self._streams
+
+    def monitor_stream(self, per_channel=False, history=False, corked=False):
+        self.stop_monitor_stream()
+
+        if not history:
+            self.history = None
+        elif self.history is None:
+            self.history = MeterHistory(HISTORY_SECONDS * METER_RATE)
+
+        channels = self.get_meter_channels(per_channel)
+        channel_map = None
+        if channels > 1 and channels == self._channel_map.channels:
+            # keep native channel positions, avoids server-side remixing
+            channel_map = self._channel_map
+        self._meter_channels = channels
+        self._connect_stream(
+            "peak",
+            self.pa_mgr.get_samplespec(channels),
+            self._on_stream_read,
+            channel_map=channel_map,
+            flags=(
+                PA_STREAM_DONT_MOVE
+                | PA_STREAM_PEAK_DETECT
+                | PA_STREAM_ADJUST_LATENCY
+                | (PA_STREAM_START_CORKED if corked else 0)
+            ),
         )
+        self._peak_corked = corked
+
+    def uncork_monitor_stream(self):
+        """Resume peak meter stream started corked."""
+        if self._peak_corked and self.monitored:
+            with self.pa_mgr.meter_lock():
+                self.pa_mgr.streams.cork(self._streams["peak"], False)
+            self._peak_corked = False
 
     def stop_monitor_stream(self):
-        if self._stream is not None:
-            pa_stream_disconnect(self._stream)
-            self._stream = None
+        self._release_stream("peak")
+
+    def monitor_loudness(self):
+        """Start loudness measurement if not already running."""
+        if "loudness" in self._streams:
+            return
 
-    def _on_stream_read(self, stream, length, _):
+        channels = max(1, min(self.channels, METER_MAX_CHANNELS))
+        if channels == self._channel_map.channels:
+            channel_map = self._channel_map
+        else:
+            channel_map = pa_channel_map()
+            pa_channel_map_init_extend(channel_map, channels, PA_CHANNEL_MAP_DEFAULT)
+        self.loudness = loudness.LoudnessMeter(loudness_weights(channel_map))
+        self._connect_stream(
+            "loudness",
+            self.pa_mgr.get_samplespec(channels, FLOAT32_SAMPLE_FORMAT, loudness.RATE),
+            self._on_loudness_read,
+            channel_map=channel_map,
+            buffer_attr=record_buffer_attr(loudness.BLOCK_SIZE * channels * 4),
+            flags=PA_STREAM_DONT_MOVE | PA_STREAM_ADJUST_LATENCY,
+        )
+
+    def stop_monitor_loudness(self):
+        """Stop loudness measurement."""
+        self._release_stream("loudness")
+        self.loudness = None
+
+    def monitor_spectrum(self, analyzer):
+        """Feed mono samples into a SpectrumAnalyzer."""
+        self.stop_monitor_spectrum()
+        self._spectrum = analyzer
+        self._connect_stream(
+            "spectrum",
+            self.pa_mgr.get_samplespec(1, FLOAT32_SAMPLE_FORMAT, spectrum.RATE),
+            self._on_spectrum_read,
+            buffer_attr=record_buffer_attr(SPECTRUM_FRAGMENT_SIZE),
+            flags=PA_STREAM_DONT_MOVE | PA_STREAM_ADJUST_LATENCY,
+        )
+
+    def stop_monitor_spectrum(self):
+        """Stop feeding spectrum analyzer."""
+        self._release_stream("spectrum")
+        self._spectrum = None
+
+    def stop_monitor_streams(self):
+        """Stop all streams monitoring this sink (input)."""
+        for name in list(self._streams):
+            self._release_stream(name)
+        self.loudness = None
+        self._spectrum = None
+
+    def _connect_stream(self, name, samplespec, handler, **kwargs):
+        """Create a stream recording from this sink (input)."""
+        with self.pa_mgr.meter_lock():
+            slot = self.pa_mgr.streams.connect_record(
+                self.pa_mgr.meter_context,
+                name,
+                samplespec,
+                "{:d}".format(self.sink_idx).encode("utf-8"),
+                handler,
+                monitor_idx=self.idx if self._is_sink_input else None,
+                closed_handler=lambda slot: self._on_stream_closed(name, slot),
+                **kwargs,
+            )
+            if slot is not None:
+                self._streams[name] = slot
+
+    def _release_stream(self, name):
+        with self.pa_mgr.meter_lock():
+            slot = self._streams.pop(name, None)
+            if slot is not None:
+                self.pa_mgr.streams.release(slot)
+
+    def _on_stream_closed(self, name, slot):
+        # terminated by server, e.g. sink input went away
+        if self._streams.get(name) == slot:
+            del self._streams[name]
+
+    @staticmethod
+    def _read_stream(stream, length):
+        """Copy pending fragment out of stream, returns None for holes."""
         data = c_void_p()
-        pa_stream_peek(stream, data, c_ulong(length))
-        data = cast(data, POINTER(c_ubyte))
-        # When PA_SAMPLE_U8 is used, samples values range from 128 to 255
-        val = sum([data[i] - 128 for i in range(length)]) / length / 128.0
+        nbytes = c_ulong(length)
+        pa_stream_peek(stream, data, nbytes)
+        if not nbytes.value:
+            return None
+        samples = string_at(data, nbytes.value) if data.value else None
         pa_stream_drop(stream)
+        return samples
+
+    def _on_loudness_read(self, stream, length):
+        samples = self._read_stream(stream, length)
+        if samples is None or self.loudness is None:
+            return
+        blocks = self.loudness.blocks
+        self.loudness.process(samples)
+        if self.loudness.blocks != blocks:
+            reading = self.loudness.reading()
+            if self._is_sink_input:
+                GObject.idle_add(
+                    self.pa_mgr.volctl.update_sink_input_loudness, self.idx, reading
+                )
+            else:
+                GObject.idle_add(
+                    self.pa_mgr.volctl.update_sink_loudness, self.idx, reading
+                )
+
+    def _on_spectrum_read(self, stream, length):
+        samples = self._read_stream(stream, length)
+        if samples is not None and self._spectrum is not None:
+            self._spectrum.push(samples)
+
+    def _on_stream_read(self, stream, length):
+        samples = self._read_stream(stream, length)
+        if samples is None:
+            return
+
+        # De-interleave with extended slices and reduce with sum(), both run in C.
+        # When PA_SAMPLE_U8 is used, samples values range from 128 to 255
+        channels = self._meter_channels
+        frames = len(samples) // channels
+        vals = tuple(
+            (sum(samples[chan::channels]) / frames - 128) / 128.0
+            for chan in range(channels)
+        )
+        if self.history is not None:
+            self.history.record(time.monotonic(), max(vals))
         if self._is_sink_input:
-            GObject.idle_add(self.pa_mgr.volctl.update_sink_input_peak, self.idx, val)
+            GObject.idle_add(self.pa_mgr.volctl.update_sink_input_peak, self.idx, vals)
         else:
-            GObject.idle_add(self.pa_mgr.volctl.update_sink_peak, self.idx, val)
+            GObject.idle_add(self.pa_mgr.volctl.update_sink_peak, self.idx, vals)
 
 
 class Sink(AbstractMonitorableSink):
@@ -534,24 +906,29 @@ class Sink(AbstractMonitorableSink):
         self.volume = struct.volume.values[0]
         self.channels = struct.volume.channels
         self.mute = bool(struct.mute)
+        in_flight = self._consume_echo()
 
-        # notify volctl about update (first sound card)
-        if self.pa_mgr.is_main_sink(self._sink_name):
+        # notify volctl about update (first sound card), skip intermediate echoes
+        if in_flight in (None, 0) and self.pa_mgr.is_main_sink(self._sink_name):
             GObject.idle_add(self.pa_mgr.volctl.update_values, self.volume, self.mute)
-        # scale update
-        GObject.idle_add(
-            self.pa_mgr.volctl.update_sink_scale, self.idx, self.volume, self.mute,
-        )
+        # scale update, skip intermediate echoes. The final one still updates
+        # the scale as the write may have come from elsewhere (tray, menu).
+        if in_flight in (None, 0):
+            GObject.idle_add(
+                self.pa_mgr.volctl.update_sink_scale, self.idx, self.volume, self.mute,
+            )
 
     def set_volume(self, volume):
         """Set volume for this sink."""
         self.volume = volume
         cvolume = cvolume_from_volume(volume, self.channels)
+        self._expect_echo()
         self.pa_mgr.set_sink_volume(self.idx, cvolume)
 
     def set_mute(self, mute):
         """Set mute for this sink."""
         self.mute = mute
+        self._expect_echo()
         self.pa_mgr.set_sink_mute(self.idx, mute and 1 or 0)
 
     @property
@@ -578,17 +955,37 @@ class SinkInput(AbstractMonitorableSink):
         self.media_name = props.get(b"media.name")
         if self.media_name is not None:
             self.media_name = self.media_name.decode("utf-8")
+        self.app_id = props.get(b"application.id")
+        if self.app_id is not None:
+            self.app_id = self.app_id.decode("utf-8")
+        self.app_binary = props.get(b"application.process.binary")
+        if self.app_binary is not None:
+            self.app_binary = self.app_binary.decode("utf-8")
         self._icon_name = props.get(b"media.icon_name")
         if self._icon_name is None:
             self._icon_name = props.get(b"application.icon_name")
         if self._icon_name is not None:
             self._icon_name = self._icon_name.decode("utf-8")
-        GObject.idle_add(
-            self.pa_mgr.volctl.update_sink_input_scale,
-            self.idx,
-            self.volume,
-            self.mute,
-        )
+        first = self._server_state is None
+        in_flight = self._consume_echo()
+        # skip intermediate echoes, the final one also refreshes scales not
+        # written to directly (group and member sliders)
+        if in_flight in (None, 0):
+            GObject.idle_add(
+                self.pa_mgr.volctl.update_sink_input_scale,
+                self.idx,
+                self.volume,
+                self.mute,
+                in_flight is None,
+            )
+        if in_flight is None and not first:
+            GObject.idle_add(
+                self.pa_mgr.volctl.sink_input_changed,
+                self.volume,
+                self.mute,
+                self.app_name or self.name,
+                (self.icon_name, self.app_id, self.app_binary, self.app_name),
+            )
 
     def _get_client(self):
         return self.pa_mgr.get_pa_client(self.client)
@@ -597,20 +994,24 @@ class SinkInput(AbstractMonitorableSink):
         """Set volume for this sink input."""
         self.volume = volume
         cvolume = cvolume_from_volume(volume, self.channels)
+        self._expect_echo()
         self.pa_mgr.set_sink_input_volume(self.idx, cvolume)
 
     def set_mute(self, mute):
         """Set mute for this sink input."""
         self.mute = mute
+        self._expect_echo()
         self.pa_mgr.set_sink_input_mute(self.idx, mute and 1 or 0)
 
     @property
     def icon_name(self):
         """Sink input icon name"""
-        try:
+        if self._icon_name is not None:
             return self._icon_name
-        except AttributeError:
+        try:
             return self._get_client().icon_name
+        except KeyError:
+            return None
 
     @property
     def name(self):
@@ -629,6 +1030,136 @@ class SinkInput(AbstractMonitorableSink):
         return self._sink_idx
 
 
+class SinkInputGroup:
+    """Sink inputs of one application (or client) controlled as a whole."""
+
+    def __init__(self, key):
+        self.key = key
+        self.members = []
+        self.levels = {}  # member index -> last peak level
+        # member index -> volume relative to the loudest member, kept while
+        # the group slider moves so the balance survives dragging to zero
+        self._ratios = {}
+
+    @staticmethod
+    def group_key(sink_input, mode):
+        """Key to group sink input by, mode is "application" or "client"."""
+        if mode == "application" and sink_input.app_name is not None:
+            return sink_input.app_name
+        return sink_input.client
+
+    def set_members(self, members):
+        """Replace members, keeps levels and ratios of remaining ones."""
+        self.members = members
+        indices = {member.idx for member in members}
+        for idx in list(self.levels):
+            if idx not in indices:
+                del self.levels[idx]
+        removed = [idx for idx in self._ratios if idx not in indices]
+        for idx in removed:
+            del self._ratios[idx]
+        new = [member for member in members if member.idx not in self._ratios]
+        if new:
+            self._add_ratios(new)
+        if new or removed:
+            # loudest member may have joined or left
+            self._normalize_ratios()
+
+    def _add_ratios(self, new):
+        """Ratios of joining members on the scale of the remaining ones."""
+        # group volume the remaining ratios refer to, from the member with
+        # the highest ratio
+        top = max(
+            (member for member in self.members if member.idx in self._ratios),
+            key=lambda member: self._ratios[member.idx],
+            default=None,
+        )
+        reference = 0.0
+        if top is not None and self._ratios[top.idx] > 0:
+            reference = top.volume / self._ratios[top.idx]
+        if reference == 0:
+            # no balance to relate to, start from the live volumes
+            reference = max(member.volume for member in new)
+        for member in new:
+            self._ratios[member.idx] = member.volume / reference if reference else 1.0
+
+    def refresh_ratios(self):
+        """Member volumes were changed individually, take over their balance."""
+        loudest = self.volume
+        if loudest == 0:
+            return  # no balance to learn, keep the previous one
+        for member in self.members:
+            self._ratios[member.idx] = member.volume / loudest
+
+    def _normalize_ratios(self):
+        highest = max(self._ratios.values(), default=0.0)
+        if highest > 0:
+            for idx in self._ratios:
+                self._ratios[idx] /= highest
+
+    @property
+    def name(self):
+        """Application name and number of streams"""
+        first = self.members[0]
+        name = first.app_name
+        if name is None:
+            name = first._get_client().name  # pylint: disable=protected-access
+        return "{} ({:d} streams)".format(name, len(self.members))
+
+    @property
+    def icon_name(self):
+        """Icon name of first member"""
+        return self.members[0].icon_name
+
+    @property
+    def app_name(self):
+        """Application name of first member"""
+        return self.members[0].app_name
+
+    @property
+    def app_id(self):
+        """Application id of first member"""
+        return self.members[0].app_id
+
+    @property
+    def app_binary(self):
+        """Binary name of first member"""
+        return self.members[0].app_binary
+
+    @property
+    def volume(self):
+        """Loudest member volume"""
+        return max(member.volume for member in self.members)
+
+    @property
+    def mute(self):
+        """Whether all members are muted"""
+        return all(member.mute for member in self.members)
+
+    @property
+    def level(self):
+        """Loudest member peak level"""
+        return max(self.levels.values(), default=0.0)
+
+    @staticmethod
+    def get_meter_channels(_):
+        """Groups show a single max-of-members level."""
+        return 1
+
+    def set_volume(self, volume):
+        """Set member volumes from their ratios, the loudest one ends at volume."""
+        for member in self.members:
+            member_volume = round(volume * self._ratios.get(member.idx, 1.0))
+            if member_volume != member.volume:
+                member.set_volume(member_volume)
+
+    def set_mute(self, mute):
+        """Set mute for all members."""
+        for member in self.members:
+            if member.mute != mute:
+                member.set_mute(mute)
+
+
 class Client:
     """Represents an audio emitting application connected to PA."""
 
@@ -0,0 +1,174 @@
+"""
+Spectrum analysis for monitor streams.
+
+Batched FFTs over overlapping Hann windows, reduced to logarithmically spaced
+frequency bands. Needs NumPy, which is an optional dependency.
+
+Samples are pushed from the PulseAudio thread and analyzed from the GUI
+thread. All buffers are allocated when the FFT size is set, so analyzing a
+frame reuses them (NumPy's rfft result being the only temporary).
+"""
+
+import threading
+
+try:
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+except ImportError:
+    np = None
+
+SPECTRUM_AVAILABLE = np is not None
+
+RATE = 48000  # in Hz
+MIN_FREQ = 30  # in Hz
+FLOOR_DB = -90.0
+MAX_BATCH = 8  # windows per analysis
+DECAY = 0.85  # level fall-off per frame without new data
+
+
+class SpectrumAnalyzer:
+    """Turns a mono float32 sample stream into log-spaced band levels."""
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, bands=48, fft_size=4096, min_fft_size=512):
+        if not SPECTRUM_AVAILABLE:
+            raise RuntimeError("Spectrum analysis needs NumPy")
+        self._lock = threading.Lock()
+        self._data_callback = None  # called once on next push, see wait()
+        self._min_fft_size = min_fft_size
+        self._bands = bands
+        # levels in range 0.0 - 1.0, one per band
+        self.levels = np.zeros(bands)
+        self._set_fft_size(fft_size)
+
+    @property
+    def fft_size(self):
+        """Current FFT size (resolution)."""
+        return self._fft_size
+
+    def reset(self):
+        """Drop buffered samples and levels."""
+        with self._lock:
+            self._written = 0
+            self._consumed = 0
+        self.levels.fill(0)
+
+    def degrade(self):
+        """Halve FFT size to save CPU. Returns False if already minimal."""
+        if self._fft_size <= self._min_fft_size:
+            return False
+        self._set_fft_size(self._fft_size // 2)
+        return True
+
+    def wait(self, callback):
+        """
+        Call callback (from the pushing thread) once new samples arrive,
+        lets a consumer stop polling while there is no data.
+        """
+        with self._lock:
+            self._data_callback = callback
+
+    def push(self, data):
+        """Append mono float32 samples (bytes-like, native endianness)."""
+        samples = np.frombuffer(data, dtype=np.float32)
+        with self._lock:
+            callback = self._data_callback
+            self._data_callback = None
+            capacity = len(self._ring)
+            if len(samples) > capacity:
+                samples = samples[-capacity:]
+            pos = self._written % capacity
+            first = min(len(samples), capacity - pos)
+            self._ring[pos : pos + first] = samples[:first]
+            self._ring[: len(samples) - first] = samples[first:]
+            self._written += len(samples)
+        if callback is not None:
+            callback()
+
+    def analyze(self):
+        """Analyze pending windows. Returns True if levels changed."""
+        windows = self._copy_pending()
+        if not windows:
+            if not self.levels.any():
+                return False
+            self.levels *= DECAY
+            self.levels[self.levels < 0.01] = 0
+            return True
+
+        fft_size = self._fft_size
+        hop = fft_size // 2
+        length = fft_size + (windows - 1) * hop
+        frames = sliding_window_view(self._linear[:length], fft_size)[::hop]
+        batch = self._batch[:windows]
+        np.multiply(frames, self._window, out=batch)
+        power = self._power[:windows]
+        np.abs(np.fft.rfft(batch, axis=1), out=power)
+        np.square(power, out=power)
+        power.mean(axis=0, out=self._mean)
+        np.dot(self._band_matrix, self._mean, out=self._band_power)
+
+        # to 0.0 - 1.0 range on a dB scale
+        np.maximum(self._band_power, 1e-12, out=self._band_power)
+        np.log10(self._band_power, out=self._band_power)
+        self._band_power *= 10 / -FLOOR_DB
+        self._band_power += 1
+        np.clip(self._band_power, 0, 1, out=self._band_power)
+        # fast attack, slow release
+        self.levels *= DECAY
+        np.maximum(self.levels, self._band_power, out=self.levels)
+        return True
+
+    def _copy_pending(self):
+        """Copy samples for pending windows into linear buffer."""
+        fft_size = self._fft_size
+        hop = fft_size // 2
+        with self._lock:
+            available = min(self._written, len(self._ring))
+            pending = self._written - self._consumed
+            if pending < hop or available < fft_size:
+                return 0
+            usable = min(pending, available)
+            windows = min(MAX_BATCH, max(1, (usable - fft_size) // hop + 1))
+            length = fft_size + (windows - 1) * hop
+            capacity = len(self._ring)
+            start = (self._written - length) % capacity
+            first = min(length, capacity - start)
+            self._linear[:first] = self._ring[start : start + first]
+            self._linear[first:length] = self._ring[: length - first]
+            self._consumed = self._written
+        return windows
+
+    def _set_fft_size(self, fft_size):
+        with self._lock:
+            self._fft_size = fft_size
+            hop = fft_size // 2
+            capacity = fft_size + (MAX_BATCH - 1) * hop
+            self._ring = np.zeros(capacity, dtype=np.float32)
+            self._linear = np.zeros(capacity, dtype=np.float32)
+            self._written = 0
+            self._consumed = 0
+        self._window = np.hanning(fft_size).astype(np.float32)
+        self._batch = np.zeros((MAX_BATCH, fft_size), dtype=np.float32)
+        self._power = np.zeros((MAX_BATCH, fft_size // 2 + 1), dtype=np.float32)
+        self._mean = np.zeros(fft_size // 2 + 1, dtype=np.float32)
+        self._band_power = np.zeros(self._bands, dtype=np.float32)
+        self._band_matrix = self._make_band_matrix(fft_size)
+
+    def _make_band_matrix(self, fft_size):
+        """Matrix averaging rfft bins into log-spaced bands."""
+        bins = fft_size // 2 + 1
+        freqs = np.arange(bins) * RATE / fft_size
+        edges = np.geomspace(MIN_FREQ, RATE / 2, self._bands + 1)
+        matrix = np.zeros((self._bands, bins), dtype=np.float32)
+        for band in range(self._bands):
+            members = np.nonzero(
+                (freqs >= edges[band]) & (freqs < edges[band + 1])
+            )[0]
+            if not members.size:
+                # band narrower than bin spacing, use nearest bin
+                center = np.sqrt(edges[band] * edges[band + 1])
+                members = [int(round(center * fft_size / RATE))]
+            matrix[band, members] = 1.0 / len(members)
+        # full scale sine equals 0 dB (Hann window has a coherent gain of 1/2)
+        return matrix / (fft_size / 4) ** 2
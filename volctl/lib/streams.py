@@ -0,0 +1,167 @@
+"""
+Record stream lifecycle.
+
+All monitor streams are created, tracked and released through a
+StreamManager. Read and state callbacks of every stream go through two shared
+ctypes trampolines which dispatch on the slot index passed as userdata.
+"""
+
+from volctl.lib.pulseaudio import (
+    pa_operation_unref,
+    pa_stream_notify_cb_t,
+    pa_stream_request_cb_t,
+    pa_stream_success_cb_t,
+    pa_stream_connect_record,
+    pa_stream_cork,
+    pa_stream_disconnect,
+    pa_stream_get_state,
+    pa_stream_new,
+    pa_stream_set_monitor_stream,
+    pa_stream_set_read_callback,
+    pa_stream_set_state_callback,
+    pa_stream_unref,
+    PA_STREAM_FAILED,
+    PA_STREAM_TERMINATED,
+)
+
+# Dispatch tables indexed by slot, slot 0 stands for NULL and is never used.
+_read_handlers = [None]
+_state_handlers = [None]
+_free_slots = []
+
+
+def _read_trampoline(stream, length, slot):
+    handler = _read_handlers[slot or 0]
+    if handler is not None:
+        handler(stream, length)
+
+
+def _state_trampoline(stream, slot):
+    handler = _state_handlers[slot or 0]
+    if handler is not None:
+        handler(slot, pa_stream_get_state(stream))
+
+
+_READ_CB = pa_stream_request_cb_t(_read_trampoline)
+_STATE_CB = pa_stream_notify_cb_t(_state_trampoline)
+_NULL_READ_CB = pa_stream_request_cb_t()
+_NULL_STATE_CB = pa_stream_notify_cb_t()
+_NULL_SUCCESS_CB = pa_stream_success_cb_t()
+
+
+class StreamManager:
+    """
+    Owns record streams: creation, state tracking, teardown and unref.
+
+    Streams are referred to by their slot number. Must be used with the
+    PulseAudio mainloop locked (or from within PulseAudio callbacks).
+    """
+
+    def __init__(self):
+        self._streams = {}  # slot -> pa_stream pointer
+        self._closed_handlers = {}
+        self.peak_streams = 0
+
+    @property
+    def live_streams(self):
+        """Number of native streams currently owned."""
+        return len(self._streams)
+
+    @property
+    def live_callbacks(self):
+        """Number of callback slots in use."""
+        return len(_read_handlers) - 1 - len(_free_slots)
+
+    @property
+    def peak_callbacks(self):
+        """Highest number of callback slots ever in use."""
+        return len(_read_handlers) - 1
+
+    def stats(self):
+        """Live and peak counts of native streams and callback slots."""
+        return {
+            "live_streams": self.live_streams,
+            "peak_streams": self.peak_streams,
+            "live_callbacks": self.live_callbacks,
+            "peak_callbacks": self.peak_callbacks,
+        }
+
+    def connect_record(
+        self,
+        context,
+        name,
+        spec,
+        device,
+        read_handler,
+        channel_map=None,
+        buffer_attr=None,
+        flags=0,
+        monitor_idx=None,
+        closed_handler=None,
+    ):
+        """
+        Create a stream recording from device and return its slot.
+
+        monitor_idx selects a sink input to record from, closed_handler is
+        called with the slot when the server terminates the stream. Returns
+        None on failure.
+        """
+        # pylint: disable=too-many-arguments
+        stream = pa_stream_new(context, name.encode("utf-8"), spec, channel_map)
+        if not stream:
+            return None
+
+        if _free_slots:
+            slot = _free_slots.pop()
+        else:
+            slot = len(_read_handlers)
+            _read_handlers.append(None)
+            _state_handlers.append(None)
+        _read_handlers[slot] = read_handler
+        _state_handlers[slot] = self._on_state
+        self._streams[slot] = stream
+        self._closed_handlers[slot] = closed_handler
+        self.peak_streams = max(self.peak_streams, len(self._streams))
+
+        pa_stream_set_state_callback(stream, _STATE_CB, slot)
+        pa_stream_set_read_callback(stream, _READ_CB, slot)
+        if monitor_idx is not None:
+            pa_stream_set_monitor_stream(stream, monitor_idx)
+        if pa_stream_connect_record(stream, device, buffer_attr, flags) < 0:
+            self.release(slot)
+            return None
+        return slot
+
+    def cork(self, slot, corked):
+        """Pause (or resume) delivery of a stream's data."""
+        stream = self._streams.get(slot)
+        if stream is not None:
+            operation = pa_stream_cork(stream, int(corked), _NULL_SUCCESS_CB, None)
+            pa_operation_unref(operation)
+
+    def release(self, slot):
+        """Disconnect and unref stream, frees its slot."""
+        stream = self._streams.pop(slot, None)
+        if stream is None:
+            return
+        self._closed_handlers.pop(slot)
+        pa_stream_set_state_callback(stream, _NULL_STATE_CB, None)
+        pa_stream_set_read_callback(stream, _NULL_READ_CB, None)
+        if pa_stream_get_state(stream) not in (PA_STREAM_FAILED, PA_STREAM_TERMINATED):
+            pa_stream_disconnect(stream)
+        pa_stream_unref(stream)
+        _read_handlers[slot] = None
+        _state_handlers[slot] = None
+        _free_slots.append(slot)
+
+    def release_all(self):
+        """Release all streams."""
+        for slot in list(self._streams):
+            self.release(slot)
+
+    def _on_state(self, slot, state):
+        if state in (PA_STREAM_FAILED, PA_STREAM_TERMINATED):
+            closed_handler = self._closed_handlers.get(slot)
+            self.release(slot)
+            if closed_handler is not None:
+                closed_handler(slot)
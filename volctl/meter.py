@@ -0,0 +1,148 @@
+"""
+Per-channel volume meter
+
+Thin vertical bars drawn next to a volume slider, one bar per channel.
+
+The static part (empty bar troughs) is rendered once into a surface. A level
+change only invalidates the strip of the bar between its old and new height,
+so a meter update repaints a few pixels instead of the whole widget.
+"""
+
+import time
+import cairo
+from gi.repository import Gtk, GLib
+
+
+class ChannelMeter(Gtk.DrawingArea):
+    """Draws one level bar per audio channel."""
+
+    BAR_WIDTH = 3
+    BAR_SPACING = 1
+    TROUGH_ALPHA = 0.1
+    BAR_ALPHA = 0.6
+
+    def __init__(self, channels):
+        super().__init__()
+        self._levels = [0.0] * channels
+        self._heights = [0] * channels  # drawn bar heights in px
+        self._background = None
+        self._set_width()
+        self.connect("draw", self._cb_draw)
+        self.connect("size-allocate", self._cb_invalidate_background)
+        self.connect("style-updated", self._cb_invalidate_background)
+
+    def _set_width(self):
+        self.set_size_request(
+            len(self._levels) * (self.BAR_WIDTH + self.BAR_SPACING) - self.BAR_SPACING,
+            -1,
+        )
+
+    @property
+    def channels(self):
+        """Number of channels displayed."""
+        return len(self._levels)
+
+    def set_channels(self, channels):
+        """Change number of channels displayed, levels are reset."""
+        if channels != len(self._levels):
+            self._levels = [0.0] * channels
+            self._heights = [0] * channels
+            self._background = None
+            self._set_width()
+            self.queue_draw()
+
+    def set_levels(self, levels):
+        """Set channel levels (0.0 - 1.0). Missing channels are zeroed."""
+        height = self.get_allocated_height()
+        for i in range(len(self._levels)):
+            val = min(max(levels[i] if i < len(levels) else 0.0, 0.0), 1.0)
+            self._levels[i] = val
+            bar_height = round(val * height)
+            old_height = self._heights[i]
+            if bar_height != old_height:
+                self._heights[i] = bar_height
+                # damage only the part of the bar that changed
+                self.queue_draw_area(
+                    i * (self.BAR_WIDTH + self.BAR_SPACING),
+                    height - max(bar_height, old_height),
+                    self.BAR_WIDTH,
+                    abs(bar_height - old_height),
+                )
+
+    def _render_background(self, width, height, color):
+        surface = self.get_window().create_similar_surface(
+            cairo.CONTENT_COLOR_ALPHA, width, height
+        )
+        cairo_r = cairo.Context(surface)
+        cairo_r.set_source_rgba(color.red, color.green, color.blue, self.TROUGH_ALPHA)
+        for i in range(len(self._levels)):
+            cairo_r.rectangle(
+                i * (self.BAR_WIDTH + self.BAR_SPACING), 0, self.BAR_WIDTH, height
+            )
+        cairo_r.fill()
+        return surface
+
+    def _cb_invalidate_background(self, *_):
+        self._background = None
+
+    def _cb_draw(self, widget, cairo_r):
+        height = widget.get_allocated_height()
+        color = widget.get_style_context().get_color(widget.get_state_flags())
+        if self._background is None:
+            self._background = self._render_background(
+                widget.get_allocated_width(), height, color
+            )
+        cairo_r.set_source_surface(self._background, 0, 0)
+        cairo_r.paint()
+
+        # GTK clips to the damaged region
+        cairo_r.set_source_rgba(color.red, color.green, color.blue, self.BAR_ALPHA)
+        xpos = 0
+        for i, level in enumerate(self._levels):
+            bar_height = round(level * height)
+            self._heights[i] = bar_height
+            if bar_height > 0:
+                cairo_r.rectangle(xpos, height - bar_height, self.BAR_WIDTH, bar_height)
+            xpos += self.BAR_WIDTH + self.BAR_SPACING
+        cairo_r.fill()
+
+
+class LevelTable:
+    """
+    Collects meter levels and applies them once per frame.
+
+    Peak updates arrive per stream at the meter rate; instead of touching
+    widgets for each one, the latest levels are kept and flushed from the
+    frame clock of widget. The tick callback only runs while levels are
+    pending, so silent or corked streams don't keep the frame clock busy.
+    """
+
+    def __init__(self, widget):
+        self._widget = widget
+        self._pending = {}  # ChannelMeter -> levels
+        self._tick = None
+        self.flush_time = 0.0  # moving average in sec
+
+    def set_levels(self, meter, levels):
+        """Queue levels for meter."""
+        self._pending[meter] = levels
+        if self._tick is None:
+            self._tick = self._widget.add_tick_callback(self._cb_tick)
+
+    def clear(self):
+        """Drop queued levels."""
+        self._pending.clear()
+        if self._tick is not None:
+            self._widget.remove_tick_callback(self._tick)
+            self._tick = None
+
+    def _cb_tick(self, widget, frame_clock):
+        self._tick = None
+        start = time.perf_counter()
+        pending = self._pending
+        self._pending = {}
+        for meter, levels in pending.items():
+            meter.set_levels(levels)
+        elapsed = time.perf_counter() - start
+        self.flush_time = 0.9 * self.flush_time + 0.1 * elapsed
+        return GLib.SOURCE_REMOVE
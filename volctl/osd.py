@@ -6,119 +6,144 @@ A transparent OSD volume indicator for the bottom-right corner.
 Various code snippets taken from https://github.com/kozec/sc-controller
 """
 
+from collections import OrderedDict
 import math
+import time
 import cairo
 from gi.repository import Gdk, Gtk, GdkX11, GLib
 
+from volctl.icons import FALLBACK_ICON
 from volctl.lib.pulseaudio import PA_VOLUME_NORM
 import volctl.lib.xwrappers as X
 
 
-class VolumeOverlay(Gtk.Window):
-    """Window that displays volume sliders."""
+class OsdRenderer:
+    """
+    Pre-rendered OSD parts for one OSD scale and display scale factor.
+
+    Background and volume indicator states are rendered up front, labels and
+    application icons on first use. Drawing a frame is then just a few surface
+    blits.
+    """
 
     BASE_WIDTH = 200
     BASE_HEIGHT = 200
     BASE_FONT_SIZE = 42
     BASE_LINE_WIDTH = 5
-    SCREEN_MARGIN = 64
     BASE_PADDING = 24
     BG_OPACITY = 0.85
     BG_CORNER_RADIUS = 8
     MUTE_OPACITY = 0.2
     TEXT_OPACITY = 0.8
     NUM_BARS = 16
+    MAX_LABELS = 64
+    MAX_ICONS = 16
 
-    def __init__(self, volctl):
-        super().__init__()
-        self._volctl = volctl
-        self.position = (-self.SCREEN_MARGIN, -self.SCREEN_MARGIN)
-
-        scale = self._volctl.settings.get_int("osd-scale") / 100
-        self._width = int(self.BASE_WIDTH * scale)
-        self._height = int(self.BASE_HEIGHT * scale)
+    def __init__(self, scale, scale_factor, icon_loader=None):
+        self.scale = scale
+        self.scale_factor = scale_factor
+        self._icon_loader = icon_loader
+        self.width = int(self.BASE_WIDTH * scale)
+        self.height = int(self.BASE_HEIGHT * scale)
         self._font_size = int(self.BASE_FONT_SIZE * scale)
         self._line_width = self.BASE_LINE_WIDTH * scale
         self._padding = int(self.BASE_PADDING * scale)
         self._corner_radius = int(self.BG_CORNER_RADIUS * scale)
 
-        self.set_default_size(self._width, self._height)
-        self._volume = 0
-        self._mute = False
-        self._hide_timeout = None
-        self._fadeout_timeout = None
-        self._opacity = 1.0
+        # layout, label height doesn't depend on the digits shown
+        _, _, _, text_height, _, _ = self._font_context(
+            cairo.ImageSurface(cairo.FORMAT_ARGB32, 1, 1)
+        ).text_extents("100 %")
+        self._ind_height = self.height - 3 * self._padding - text_height
+        # application icon fits into the inner circle of the indicator
+        self._icon_size = int(self._ind_height / 1.618 / math.sqrt(2))
 
-        self.set_decorated(False)
-        self.stick()
-        self.set_skip_taskbar_hint(True)
-        self.set_skip_pager_hint(True)
-        self.set_keep_above(True)
-        self.set_type_hint(Gdk.WindowTypeHint.NOTIFICATION)
-        self.set_resizable(False)
+        self._background = self._render_background()
+        self._bars = {
+            (bars, mute): self._render_bars(bars, mute)
+            for bars in range(1, self.NUM_BARS + 1)
+            for mute in (False, True)
+        }
+        self._labels = OrderedDict()  # (text, mute, small) -> (surface, x, y)
+        self._icons = OrderedDict()  # (icon, mute) -> (surface, x, y) or None
 
-        self.screen = self.get_screen()
-        self.visual = self.screen.get_rgba_visual()
-        if self.visual is not None and self.screen.is_composited():
-            self._compositing = True
-            self.set_visual(self.visual)
-        else:
-            self._compositing = False
-        self.set_app_paintable(True)
-        self.connect("draw", self._draw_osd)
+    def draw(self, cairo_r, volume, mute, opacity=1.0, app=None):
+        """
+        Draw OSD for volume and mute state. With app given as (name, icon),
+        the compact application OSD is drawn instead of the percentage.
+        """
+        val = float(volume) / float(PA_VOLUME_NORM)
 
-        self.realize()
-        self.get_window().set_override_redirect(True)
-        self._move_to_corner()
-        Gtk.Window.show(self)
-        self._make_window_clicktrough()
+        cairo_r.set_operator(cairo.OPERATOR_SOURCE)
+        cairo_r.set_source_surface(self._background, 0, 0)
+        cairo_r.paint_with_alpha(opacity)
+        cairo_r.set_operator(cairo.OPERATOR_OVER)
 
-    def update_values(self, volume, mute):
-        """Remember current volume and mute values."""
-        self._volume = volume
-        self._mute = mute
-        self._unhide()
-        if self._hide_timeout is not None:
-            GLib.Source.remove(self._hide_timeout)
-        self._hide_timeout = GLib.timeout_add(
-            self._volctl.settings.get_int("osd-timeout"), self._cb_hide_timeout
+        bars = min(round(self.NUM_BARS * val), self.NUM_BARS)
+        if bars > 0:
+            self._blit(cairo_r, self._bars[(bars, mute)], opacity)
+        if app is None:
+            self._blit(
+                cairo_r, self._label("{:d} %".format(round(100 * val)), mute), opacity
+            )
+        else:
+            name, icon = app
+            icon_part = self._icon(icon, mute)
+            if icon_part is not None:
+                self._blit(cairo_r, icon_part, opacity)
+            self._blit(cairo_r, self._label(name, mute, small=True), opacity)
+
+    def _blit(self, cairo_r, part, opacity):
+        surface, xpos, ypos = part
+        # snap to device pixels, fractional offsets resample (blur) the part
+        cairo_r.set_source_surface(
+            surface,
+            round(xpos * self.scale_factor) / self.scale_factor,
+            round(ypos * self.scale_factor) / self.scale_factor,
         )
+        cairo_r.paint_with_alpha(opacity)
 
-    def _move_to_corner(self):
-        xpos, ypos = self._compute_position()
-        if xpos < 0:  # Negative X position is counted from right border
-            xpos = Gdk.Screen.width() - self.get_allocated_width() + xpos + 1
-        if ypos < 0:  # Negative Y position is counted from bottom border
-            ypos = Gdk.Screen.height() - self.get_allocated_height() + ypos + 1
+    def _new_surface(self, width, height):
+        surface = cairo.ImageSurface(
+            cairo.FORMAT_ARGB32,
+            math.ceil(width * self.scale_factor),
+            math.ceil(height * self.scale_factor),
+        )
+        surface.set_device_scale(self.scale_factor, self.scale_factor)
+        return surface
 
-        self.move(xpos, ypos)
+    def _font_context(self, surface, small=False):
+        cairo_r = cairo.Context(surface)
+        cairo_r.select_font_face("sans-serif")
+        cairo_r.set_font_size(self._font_size / 2 if small else self._font_size)
+        return cairo_r
 
-    def _draw_osd(self, _, cairo_r):
-        """Draw on-screen volume display."""
-        val = float(self._volume) / float(PA_VOLUME_NORM)
-        mute_opacity = self.MUTE_OPACITY if self._mute else 1.0
-        xcenter = self._width / 2
+    def _foreground(self, cairo_r, mute):
+        mute_opacity = self.MUTE_OPACITY if mute else 1.0
+        cairo_r.set_source_rgba(1.0, 1.0, 1.0, self.TEXT_OPACITY * mute_opacity)
 
-        # background
+    def _render_background(self):
+        surface = self._new_surface(self.width, self.height)
+        cairo_r = cairo.Context(surface)
         deg = math.pi / 180.0
         cairo_r.new_sub_path()
         cairo_r.arc(
-            self._width - self._corner_radius,
+            self.width - self._corner_radius,
             self._corner_radius,
             self._corner_radius,
             -90 * deg,
             0,
         )
         cairo_r.arc(
-            self._width - self._corner_radius,
-            self._height - self._corner_radius,
+            self.width - self._corner_radius,
+            self.height - self._corner_radius,
             self._corner_radius,
             0,
             90 * deg,
         )
         cairo_r.arc(
             self._corner_radius,
-            self._height - self._corner_radius,
+            self.height - self._corner_radius,
             self._corner_radius,
             90 * deg,
             180 * deg,
@@ -131,39 +156,216 @@ class VolumeOverlay(Gtk.Window):
             270 * deg,
         )
         cairo_r.close_path()
-
-        cairo_r.set_source_rgba(0.1, 0.1, 0.1, self.BG_OPACITY * self._opacity)
-        cairo_r.set_operator(cairo.OPERATOR_SOURCE)
+        cairo_r.set_source_rgba(0.1, 0.1, 0.1, self.BG_OPACITY)
         cairo_r.fill()
-        cairo_r.set_operator(cairo.OPERATOR_OVER)
+        return surface
 
-        # color
-        cairo_r.set_source_rgba(
-            1.0, 1.0, 1.0, self.TEXT_OPACITY * mute_opacity * self._opacity
-        )
-
-        # text
-        text = "{:d} %".format(round(100 * val))
-        cairo_r.select_font_face("sans-serif")
-        cairo_r.set_font_size(self._font_size)
-        _, _, text_width, text_height, _, _ = cairo_r.text_extents(text)
-        cairo_r.move_to(xcenter - text_width / 2, self._height - self._padding)
-        cairo_r.show_text(text)
-
-        # volume indicator
-        ind_height = self._height - 3 * self._padding - text_height
-        outer_radius = ind_height / 2
+    def _render_bars(self, bars, mute):
+        outer_radius = self._ind_height / 2
         inner_radius = outer_radius / 1.618
-        bars = min(round(self.NUM_BARS * val), self.NUM_BARS)
+        size = 2 * (outer_radius + self._line_width)
+        surface = self._new_surface(size, size)
+        cairo_r = cairo.Context(surface)
+        self._foreground(cairo_r, mute)
         cairo_r.set_line_width(self._line_width)
         cairo_r.set_line_cap(cairo.LINE_CAP_ROUND)
         for i in range(bars):
             cairo_r.identity_matrix()
-            cairo_r.translate(xcenter, self._padding + ind_height / 2)
+            cairo_r.translate(size / 2, size / 2)
             cairo_r.rotate(math.pi + 2 * math.pi / self.NUM_BARS * i)
             cairo_r.move_to(0.0, -inner_radius)
             cairo_r.line_to(0.0, -outer_radius)
             cairo_r.stroke()
+        return (
+            surface,
+            self.width / 2 - size / 2,
+            self._padding + self._ind_height / 2 - size / 2,
+        )
+
+    def _label(self, text, mute, small=False):
+        key = (text, mute, small)
+        try:
+            self._labels.move_to_end(key)
+            return self._labels[key]
+        except KeyError:
+            pass
+
+        measure = self._font_context(
+            cairo.ImageSurface(cairo.FORMAT_ARGB32, 1, 1), small
+        )
+        max_width = self.width - 2 * self._padding
+        while len(text) > 1 and measure.text_extents(text)[2] > max_width:
+            text = text[:-2].rstrip() + "\u2026"  # ellipsize
+        x_bearing, y_bearing, text_width, text_height, _, _ = measure.text_extents(text)
+        surface = self._new_surface(text_width + 2, text_height + 2)
+        cairo_r = self._font_context(surface, small)
+        self._foreground(cairo_r, mute)
+        cairo_r.move_to(1 - x_bearing, 1 - y_bearing)
+        cairo_r.show_text(text)
+
+        # same spot as text drawn at baseline (center - width / 2, bottom padding)
+        label = (
+            surface,
+            self.width / 2 - text_width / 2 + x_bearing - 1,
+            self.height - self._padding + y_bearing - 1,
+        )
+        self._labels[key] = label
+        if len(self._labels) > self.MAX_LABELS:
+            self._labels.popitem(last=False)
+        return label
+
+    def _icon(self, icon, mute):
+        key = (icon, mute)
+        try:
+            self._icons.move_to_end(key)
+            return self._icons[key]
+        except KeyError:
+            pass
+
+        part = None
+        pixbuf = None
+        if self._icon_loader is not None:
+            pixbuf = self._icon_loader(icon, self._icon_size, self.scale_factor)
+        if pixbuf is not None:
+            surface = self._new_surface(self._icon_size, self._icon_size)
+            cairo_r = cairo.Context(surface)
+            # pixbuf is in device pixels
+            cairo_r.scale(1 / self.scale_factor, 1 / self.scale_factor)
+            Gdk.cairo_set_source_pixbuf(cairo_r, pixbuf, 0, 0)
+            cairo_r.paint_with_alpha(self.MUTE_OPACITY if mute else 1.0)
+            part = (
+                surface,
+                self.width / 2 - self._icon_size / 2,
+                self._padding + self._ind_height / 2 - self._icon_size / 2,
+            )
+        self._icons[key] = part
+        if len(self._icons) > self.MAX_ICONS:
+            self._icons.popitem(last=False)
+        return part
+
+
+class VolumeOverlay(Gtk.Window):
+    """Persistent OSD window, shown and hidden on volume changes."""
+
+    SCREEN_MARGIN = 64
+    FADE_DURATION = 0.6  # sec
+
+    def __init__(self, volctl):
+        super().__init__()
+        self._volctl = volctl
+        self.position = (-self.SCREEN_MARGIN, -self.SCREEN_MARGIN)
+
+        scale = self._volctl.settings.get_int("osd-scale") / 100
+        self._renderer = OsdRenderer(scale, self.get_scale_factor(), self._load_icon)
+        self._width = self._renderer.width
+        self._height = self._renderer.height
+        self.draw_time = 0.0  # moving average in sec
+
+        self.set_default_size(self._width, self._height)
+        self._volume = 0
+        self._mute = False
+        self._app = None
+        self._hide_timeout = None
+        self._hide_at = 0  # monotonic time in usec
+        self._update_tick = None
+        self._geometry = None
+        self._geometry_valid = False
+        self._window_position = None
+        self._fadeout_timeout = None
+        self._fade_tick = None
+        self._fade_start = None
+        self._fade_cpu_start = None
+        self._opacity = 1.0
+        self.fade_cpu = 0.0  # moving average of CPU time per fade in sec
+        self.updates = 0
+        self.updates_drawn = 0
+
+        self.set_decorated(False)
+        self.stick()
+        self.set_skip_taskbar_hint(True)
+        self.set_skip_pager_hint(True)
+        self.set_keep_above(True)
+        self.set_type_hint(Gdk.WindowTypeHint.NOTIFICATION)
+        self.set_resizable(False)
+
+        self.screen = self.get_screen()
+        self.visual = self.screen.get_rgba_visual()
+        if self.visual is not None and self.screen.is_composited():
+            self._compositing = True
+            self.set_visual(self.visual)
+        else:
+            self._compositing = False
+        # let the compositor fade the window if it honors window opacity
+        self._window_opacity = (
+            self._compositing
+            and GdkX11.X11Screen.supports_net_wm_hint(
+                self.screen, Gdk.Atom.intern("_NET_WM_WINDOW_OPACITY", False)
+            )
+        )
+        self.set_app_paintable(True)
+        self.connect("draw", self._draw_osd)
+        self.connect("destroy", self._cb_destroy)
+        # visual (and input shape) are only set up once, rebuild on changes
+        self.connect("screen-changed", self._cb_rebuild)
+        self._screen_handlers = [
+            self.screen.connect("composited-changed", self._cb_rebuild),
+            self.screen.connect("monitors-changed", self._cb_invalidate_geometry),
+            self.screen.connect("size-changed", self._cb_invalidate_geometry),
+        ]
+
+        # window is kept and only shown/hidden
+        self.realize()
+        self.get_window().set_override_redirect(True)
+        self._make_window_clicktrough()
+
+    def update_values(self, volume, mute, app=None):
+        """
+        Remember current volume and mute values, shown on next frame. app is
+        (name, icon) for an application stream, None for the main sink.
+        """
+        self._volume = volume
+        self._mute = mute
+        self._app = app
+        self.updates += 1
+        timeout = self._volctl.settings.get_int("osd-timeout")
+        # hide timer is only pushed back, it reschedules itself when it fires
+        self._hide_at = GLib.get_monotonic_time() + timeout * 1000
+        if self._hide_timeout is None:
+            self._hide_timeout = GLib.timeout_add(timeout, self._cb_hide_timeout)
+
+        if not self.get_visible() or self._fading:
+            self._unhide()
+        elif self._update_tick is None:
+            self._update_tick = self.add_tick_callback(self._cb_update_tick)
+
+    def _move_to_corner(self):
+        xpos, ypos = self._compute_position()
+        if xpos < 0:  # Negative X position is counted from right border
+            xpos = Gdk.Screen.width() - self._width + xpos + 1
+        if ypos < 0:  # Negative Y position is counted from bottom border
+            ypos = Gdk.Screen.height() - self._height + ypos + 1
+
+        if (xpos, ypos) != self._window_position:
+            self._window_position = (xpos, ypos)
+            self.move(xpos, ypos)
+
+    def _draw_osd(self, _, cairo_r):
+        """Draw on-screen volume display."""
+        start = time.perf_counter()
+        scale_factor = self.get_scale_factor()
+        if scale_factor != self._renderer.scale_factor:
+            self._renderer = OsdRenderer(
+                self._renderer.scale, scale_factor, self._load_icon
+            )
+        self._renderer.draw(cairo_r, self._volume, self._mute, self._opacity, self._app)
+        self.draw_time = 0.9 * self.draw_time + 0.1 * (time.perf_counter() - start)
+
+    def _load_icon(self, icon, size, scale):
+        icons = self._volctl.icons
+        pixbuf = icons.pixbuf(icon, size, scale)
+        if pixbuf is None:
+            pixbuf = icons.pixbuf(FALLBACK_ICON, size, scale)
+        return pixbuf
 
     def _compute_position(self):
         """Adjusts position for currently active screen (display)."""
@@ -194,9 +396,15 @@ class VolumeOverlay(Gtk.Window):
     def _get_active_screen_geometry(self):
         """
         Returns geometry of active screen or None if active screen
-        cannot be determined.
+        cannot be determined. Cached until monitors change or OSD reappears.
         """
-        screen = self.get_window().get_screen()
+        if not self._geometry_valid:
+            self._geometry = self._lookup_active_screen_geometry()
+            self._geometry_valid = True
+        return self._geometry
+
+    def _lookup_active_screen_geometry(self):
+        screen = self.screen
         active_window = screen.get_active_window()
         if active_window:
             monitor = screen.get_monitor_at_window(active_window)
@@ -205,21 +413,48 @@ class VolumeOverlay(Gtk.Window):
         return None
 
     def _get_window_size(self):
-        return self.get_window().get_width(), self.get_window().get_height()
+        return self._width, self._height
 
     def _hide(self):
-        if self._compositing:
+        self._fade_cpu_start = time.process_time()
+        if self._window_opacity:
+            self._fade_start = None
+            self._fade_tick = self.add_tick_callback(self._cb_fade_tick)
+        elif self._compositing:
             self._fadeout_timeout = GLib.timeout_add(30, self._cb_fadeout_timeout)
         else:
-            self.destroy()
+            self.hide()
 
-    def _unhide(self):
+    @property
+    def _fading(self):
+        return self._fade_tick is not None or self._fadeout_timeout is not None
+
+    def _stop_fade(self):
+        if self._fade_tick is not None:
+            self.remove_tick_callback(self._fade_tick)
+            self._fade_tick = None
         if self._fadeout_timeout is not None:
             GLib.Source.remove(self._fadeout_timeout)
             self._fadeout_timeout = None
+
+    def _fade_done(self):
+        self.hide()
+        cpu = time.process_time() - self._fade_cpu_start
+        self.fade_cpu = 0.9 * self.fade_cpu + 0.1 * cpu
+
+    def _unhide(self):
+        if not self.get_visible():
+            # active window may have moved to another monitor meanwhile
+            self._geometry_valid = False
+        self._stop_fade()
+        self.updates_drawn += 1
         self._move_to_corner()
         self._opacity = 1.0
-        self.queue_draw()
+        self.set_opacity(1.0)
+        if self.get_visible():
+            self.queue_draw()
+        else:
+            self.show()
 
     def _cb_fadeout_timeout(self):
         self._opacity -= 0.05
@@ -228,9 +463,56 @@ class VolumeOverlay(Gtk.Window):
             return True
         self._opacity = 0.0
         self._fadeout_timeout = None
-        self.destroy()
+        self._fade_done()
         return False
 
+    def _cb_fade_tick(self, _, frame_clock):
+        # compositor applies the window opacity, no repaint needed
+        now = frame_clock.get_frame_time() / 1e6
+        if self._fade_start is None:
+            self._fade_start = now
+        opacity = 1.0 - (now - self._fade_start) / self.FADE_DURATION
+        if opacity > 0:
+            self.set_opacity(opacity)
+            return GLib.SOURCE_CONTINUE
+        self._fade_tick = None
+        self._fade_done()
+        return GLib.SOURCE_REMOVE
+
+    def _cb_invalidate_geometry(self, _):
+        self._geometry_valid = False
+        self._window_position = None
+        if self.get_visible():
+            self._move_to_corner()
+
+    def _cb_rebuild(self, *_):
+        self.destroy()
+
+    def _cb_destroy(self, _):
+        for handler in self._screen_handlers:
+            self.screen.disconnect(handler)
+        self._stop_fade()
+        if self._update_tick is not None:
+            self.remove_tick_callback(self._update_tick)
+            self._update_tick = None
+        if self._hide_timeout is not None:
+            GLib.Source.remove(self._hide_timeout)
+            self._hide_timeout = None
+
+    def _cb_update_tick(self, *_):
+        self._update_tick = None
+        self.updates_drawn += 1
+        self._move_to_corner()
+        self.queue_draw()
+        return GLib.SOURCE_REMOVE
+
     def _cb_hide_timeout(self):
-        self._hide_timeout = None
-        self._hide()
+        remaining = self._hide_at - GLib.get_monotonic_time()
+        if remaining > 0:
+            self._hide_timeout = GLib.timeout_add(
+                max(remaining // 1000, 1), self._cb_hide_timeout
+            )
+        else:
+            self._hide_timeout = None
+            self._hide()
+        return GLib.SOURCE_REMOVE
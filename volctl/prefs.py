@@ -12,6 +12,8 @@ class PreferencesDialog(Gtk.Dialog):
         self._default_mixer_cmd = default_mixer_cmd
         self._row_timeout = None
         self._row_osd_timeout = None
+        self._row_osd_sink_inputs = None
+        self._row_vu_per_channel = None
         self._settings.connect("changed", self._cb_settings_changed)
         self._setup_ui()
 
@@ -35,15 +37,23 @@ class PreferencesDialog(Gtk.Dialog):
         self.listbox.add(row)
 
         self._add_switch("show-percentage")
+        self._add_combo("group-sink-inputs")
         self._add_switch("auto-close")
         self._row_timeout = self._add_scale("timeout", self._scale_timeout_format)
         self._add_scale("mouse-wheel-step", self._scale_mouse_wheel_step_format)
+        self._add_scale("warm-up-timeout", self._scale_timeout_format)
         self._add_switch("osd-enabled")
         self._row_osd_timeout = self._add_scale(
             "osd-timeout", self._scale_timeout_format
         )
         self._row_osd_size = self._add_scale("osd-scale", self._scale_osd_size_format)
+        self._row_osd_sink_inputs = self._add_switch("osd-sink-inputs")
         self._add_switch("vu-enabled")
+        self._row_vu_per_channel = self._add_switch("vu-per-channel")
+        self._add_switch("meter-history")
+        self._add_switch("tray-level")
+        self._add_switch("spectrum-enabled")
+        self._add_switch("loudness-enabled")
         self._add_entry("mixer-command", self._default_mixer_cmd)
 
         self._update_rows()
@@ -68,6 +78,7 @@ class PreferencesDialog(Gtk.Dialog):
         hbox.pack_start(switch, False, True, 10)
 
         self.listbox.add(row)
+        return row
 
     def _add_scale(self, name, format_func):
         key = self._schema.get_key(name)
@@ -97,6 +108,27 @@ class PreferencesDialog(Gtk.Dialog):
         self.listbox.add(row)
         return row
 
+    def _add_combo(self, name):
+        key = self._schema.get_key(name)
+        row = Gtk.ListBoxRow()
+        row.set_tooltip_text(key.get_description())
+
+        hbox = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL)
+        row.add(hbox)
+        vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
+        hbox.pack_start(vbox, True, True, 10)
+
+        label = Gtk.Label(key.get_summary(), xalign=0)
+        vbox.pack_start(label, True, True, 0)
+        combo = Gtk.ComboBoxText()
+        for choice in key.get_range().unpack()[1]:
+            combo.append(choice, choice.capitalize())
+        self._settings.bind(name, combo, "active-id", Gio.SettingsBindFlags.DEFAULT)
+        hbox.pack_start(combo, False, True, 10)
+
+        self.listbox.add(row)
+        return row
+
     def _add_entry(self, name, placeholder):
         key = self._schema.get_key(name)
         row = Gtk.ListBoxRow()
@@ -136,9 +168,15 @@ class PreferencesDialog(Gtk.Dialog):
         if self._settings.get_boolean("osd-enabled"):
             self._row_osd_timeout.show()
             self._row_osd_size.show()
+            self._row_osd_sink_inputs.show()
         else:
             self._row_osd_timeout.hide()
             self._row_osd_size.hide()
+            self._row_osd_sink_inputs.hide()
+        if self._settings.get_boolean("vu-enabled"):
+            self._row_vu_per_channel.show()
+        else:
+            self._row_vu_per_channel.hide()
 
     # gsettings callback
 
@@ -0,0 +1,72 @@
+"""
+Scroll coalescing
+
+Touchpads and high-resolution wheels deliver many small scroll events per
+frame. Steps are summed per target and applied once per frame, so a burst
+of events results in one volume write.
+"""
+
+from gi.repository import Gdk, GLib
+
+FRAME_INTERVAL = 16  # ms, used without a frame clock
+
+
+def scroll_steps(event):
+    """Volume steps (positive is up) of a scroll event, None if not vertical."""
+    if event.direction == Gdk.ScrollDirection.UP:
+        return 1.0
+    if event.direction == Gdk.ScrollDirection.DOWN:
+        return -1.0
+    if event.direction == Gdk.ScrollDirection.SMOOTH:
+        _, _, delta_y = event.get_scroll_deltas()
+        if delta_y != 0:
+            return -delta_y
+    return None
+
+
+class ScrollAccumulator:
+    """
+    Collects scroll steps per target and passes them to apply(target, steps)
+    once per frame.
+
+    Flushes from the frame clock of widget, or from a timeout if there is
+    no widget (e.g. for the status icon).
+    """
+
+    def __init__(self, apply, widget=None):
+        self._apply = apply
+        self._widget = widget
+        self._steps = {}  # target -> summed steps
+        self._source = None
+
+    @property
+    def pending(self):
+        """Whether steps are waiting to be applied."""
+        return bool(self._steps)
+
+    def add(self, target, steps):
+        """Queue steps for target."""
+        self._steps[target] = self._steps.get(target, 0.0) + steps
+        if self._source is None:
+            if self._widget is not None:
+                self._source = self._widget.add_tick_callback(self._cb_flush)
+            else:
+                self._source = GLib.timeout_add(FRAME_INTERVAL, self._cb_flush)
+
+    def cancel(self):
+        """Drop queued steps."""
+        if self._source is not None:
+            if self._widget is not None:
+                self._widget.remove_tick_callback(self._source)
+            else:
+                GLib.Source.remove(self._source)
+            self._source = None
+        self._steps.clear()
+
+    def _cb_flush(self, *_):
+        self._source = None
+        pending = self._steps
+        self._steps = {}
+        for target, steps in pending.items():
+            self._apply(target, steps)
+        return GLib.SOURCE_REMOVE
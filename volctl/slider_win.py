@@ -6,8 +6,16 @@ Small window that appears next to tray icon when activated. It displays
 master and app volume sliders.
 """
 
+import math
+import sys
+import time
 from gi.repository import Gtk, Gdk, GLib, GObject
 
+from volctl.meter import ChannelMeter, LevelTable
+from volctl.scroll import ScrollAccumulator, scroll_steps
+from volctl.spectrum import SpectrumView
+from volctl.lib.spectrum import SPECTRUM_AVAILABLE, SpectrumAnalyzer
+from volctl.lib.pa_wrapper import SinkInputGroup
 from volctl.lib.pulseaudio import (
     PA_VOLUME_MUTED,
     PA_VOLUME_NORM,
@@ -16,40 +24,204 @@ from volctl.lib.pulseaudio import (
 )
 
 
+class SliderColumn:
+    """Recyclable widgets of one slider column, bound to a sink (input)."""
+
+    # pylint: disable=too-few-public-methods,too-many-instance-attributes
+
+    def __init__(self, scale, btn, meter, top, expander, icons):
+        self.key = None  # ("sink" | "input" | "group", index) of bound object
+        self.sink = None
+        self.scale = scale
+        self.btn = btn
+        self.meter = meter
+        self.expander = expander  # shown for groups
+        self._icons = icons
+        self.top = top  # widget in upper grid row (scale + meter)
+        self.pos = None
+        self.name = None
+        self.icon_name = None
+        self.handlers = []  # (widget, handler id) blocked while binding
+
+    def update_labels(self, name, icon_name):
+        """Update name and icon (resolved by IconResolver) if they changed."""
+        if name != self.name:
+            self.name = name
+            self.scale.set_tooltip_text(name)
+            self.btn.set_tooltip_text(name)
+        if icon_name != self.icon_name:
+            self.icon_name = icon_name
+            self._icons.set_image(
+                self.btn.get_image(), icon_name, Gtk.IconSize.SMALL_TOOLBAR
+            )
+
+
 class VolumeSliders(Gtk.Window):
     """Window that displays volume sliders."""
 
     SPACING = 6
+    MAX_COLUMNS = 24  # widgets are only created for the visible columns
+    COLUMN_WIDTH = 40  # estimate, to fit columns on the monitor
 
-    def __init__(self, volctl, monitor_rect):
+    def __init__(self, volctl):
         super().__init__(type=Gtk.WindowType.POPUP)
         self._volctl = volctl
-        self._monitor_rect = monitor_rect
-        self._grid = None
+        self._monitor_rect = None
         self._show_percentage = self._volctl.settings.get_boolean("show-percentage")
-
-        # gui objects by index
-        self._sink_scales = None
-        self._sink_input_scales = None
+        self._vu_per_channel = self._volctl.settings.get_boolean(
+            "vu-enabled"
+        ) and self._volctl.settings.get_boolean("vu-per-channel")
+
+        # (key, sink) of all sinks and sink inputs, only a slice is shown
+        self._items = []
+        self._sink_count = 0
+        self._offset = 0
+        self._max_columns = self.MAX_COLUMNS
+        self._columns = []  # SliderColumn pool for visible slice
+        self._groups = {}  # group key -> SinkInputGroup
+        self._group_of = {}  # sink input index -> SinkInputGroup
+        self._expanded = set()  # group keys showing their members
+
+        # gui objects of bound columns by index
+        self._sink_scales = {}
+        self._sink_input_scales = {}
+        self._sink_meters = {}
+        self._sink_input_meters = {}
+        self._group_scales = {}
+        self._group_meters = {}
+        self.reconcile_time = 0.0  # duration of last reconcile_sliders() in sec
+        self._popup_start = None
+        self.popup_latency = 0.0  # click to first paint in sec
+        self.popup_latency_max = 0.0
 
         self.connect("enter-notify-event", self._cb_enter_notify)
         self.connect("leave-notify-event", self._cb_leave_notify)
+        self.connect_after("draw", self._cb_draw)
 
         self._frame = Gtk.Frame()
         self._frame.set_shadow_type(Gtk.ShadowType.OUT)
         self.add(self._frame)
-        self.create_sliders()
+        self._box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
+        self._frame.add(self._box)
+        self._grid = Gtk.Grid()
+        self._grid.set_column_spacing(2)
+        self._grid.set_row_spacing(self.SPACING)
+        self._box.pack_start(self._grid, True, True, 0)
+        self._adjustment = Gtk.Adjustment(0, 0, 0, 1, 1, 0)
+        self._adjustment.connect("value-changed", self._cb_scroll_changed)
+        self._scrollbar = Gtk.Scrollbar(
+            orientation=Gtk.Orientation.HORIZONTAL, adjustment=self._adjustment
+        )
+        self._scrollbar.set_no_show_all(True)
+        self._box.pack_start(self._scrollbar, False, True, 0)
+        self._separator = Gtk.Separator().new(Gtk.Orientation.VERTICAL)
+        self._separator.set_margin_top(self.SPACING)
+        self._separator.set_margin_bottom(self.SPACING)
+        self._separator_pos = None
+
+        # spectrum analyzer
+        self._spectrum_analyzer = None
+        self._spectrum_source = None
+        if self._volctl.settings.get_boolean("spectrum-enabled"):
+            if SPECTRUM_AVAILABLE:
+                self._spectrum_analyzer = SpectrumAnalyzer()
+                spectrum_view = SpectrumView(self._spectrum_analyzer)
+                spectrum_view.set_margin_start(self.SPACING)
+                spectrum_view.set_margin_end(self.SPACING)
+                spectrum_view.set_margin_bottom(self.SPACING)
+                self._box.pack_end(spectrum_view, False, True, 0)
+                self.connect("destroy", self._cb_destroy)
+            else:
+                print("Spectrum analyzer needs NumPy", file=sys.stderr)
+
+        # meter updates are applied once per frame
+        self._level_table = None
+        if self._volctl.settings.get_boolean("vu-enabled"):
+            self._level_table = LevelTable(self)
+        self._scroll = ScrollAccumulator(self._apply_scroll, self)
 
         # timeout
         self._timeout = None
+
+        # built hidden, shown by popup()
+        self.reconcile_sliders()
+        self._frame.show_all()
+
+    def popup(self, monitor_rect, start=None):
+        """Show window next to tray icon, start is the click time (perf_counter)."""
+        self._popup_start = time.perf_counter() if start is None else start
+        self._monitor_rect = monitor_rect
+        max_columns = max(
+            1,
+            min(
+                self.MAX_COLUMNS,
+                (monitor_rect.width - 2 * self.SPACING) // self.COLUMN_WIDTH,
+            ),
+        )
+        pa_threaded_mainloop_lock(self._volctl.pa_mgr.mainloop)
+        if max_columns != self._max_columns:
+            self._max_columns = max_columns
+            self._layout()
+        if self._spectrum_analyzer is not None:
+            self._update_spectrum_source()
+        pa_threaded_mainloop_unlock(self._volctl.pa_mgr.mainloop)
+        self.resize(1, 1)  # smallest possible
+        self._set_position()  # last known size
+        self.show()
+        GObject.idle_add(self._set_position)
         self._enable_timeout()
 
+    def popdown(self):
+        """Hide window, keeps widgets for the next popup."""
+        self.hide()
+        self._remove_timeout()
+        self._scroll.cancel()
+        if self._spectrum_analyzer is not None:
+            pa_threaded_mainloop_lock(self._volctl.pa_mgr.mainloop)
+            self._set_spectrum_source(None)
+            pa_threaded_mainloop_unlock(self._volctl.pa_mgr.mainloop)
+        # don't show stale levels next time
+        if self._level_table is not None:
+            self._level_table.clear()
+        for column in self._columns:
+            if column.meter is not None:
+                column.meter.set_levels(())
+        for group in self._groups.values():
+            group.levels.clear()
+
+    @property
+    def column_count(self):
+        """Number of sinks and sink inputs."""
+        return len(self._items)
+
+    @property
+    def meter_flush_time(self):
+        """Average time to apply a frame's meter updates in sec."""
+        if self._level_table is None:
+            return 0.0
+        return self._level_table.flush_time
+
+    @property
+    def widget_columns(self):
+        """Number of instantiated slider columns."""
+        return len(self._columns)
+
+    def visible_sinks(self):
+        """Sinks (inputs) having a visible slider, including group members."""
+        sinks = []
+        for column in self._columns:
+            if column.key is None:
+                continue
+            if column.key[0] == "group":
+                sinks.extend(column.sink.members)
+            else:
+                sinks.append(column.sink)
+        return sinks
+
     def set_increments(self):
         """Set sliders increment step."""
-        for _, scale in self._sink_scales.items():
-            self._set_increments_on_scale(scale)
-        for _, scale in self._sink_input_scales.items():
-            self._set_increments_on_scale(scale)
+        for column in self._columns:
+            self._set_increments_on_scale(column.scale)
 
     def reset_timeout(self):
         """Reset auto-close timeout."""
@@ -89,72 +261,225 @@ class VolumeSliders(Gtk.Window):
         self.set_screen(screen)
         self.move(win_x, win_y)
 
-    def create_sliders(self):
-        """(Re-)create sliders from PulseAudio sinks."""
-        if self._grid is not None:
-            self._grid.destroy()
-        if self._sink_scales is not None:
-            del self._sink_scales
-        if self._sink_input_scales is not None:
-            del self._sink_input_scales
-        self._sink_scales = {}
-        self._sink_input_scales = {}
-
-        self._grid = Gtk.Grid()
-        self._grid.set_column_spacing(2)
-        self._grid.set_row_spacing(self.SPACING)
-        self._frame.add(self._grid)
-
-        pos = 0
+    def reconcile_sliders(self):
+        """Rebind visible slider columns to match PulseAudio sinks."""
+        start = time.perf_counter()
+        pa_mgr = self._volctl.pa_mgr
 
         # touching pa objects here!
-        pa_threaded_mainloop_lock(self._volctl.pa_mgr.mainloop)
+        pa_threaded_mainloop_lock(pa_mgr.mainloop)
 
-        # sinks
-        for _, sink in self._volctl.pa_mgr.pa_sinks.items():
-            scale, btn = self._add_scale(sink)
-            self._sink_scales[sink.idx] = (scale, btn)
-            scale.connect("value-changed", self._cb_sink_scale_change)
-            self._update_scale_values((scale, btn), sink.volume, sink.mute)
-            scale.set_margin_top(self.SPACING)
-            btn.set_margin_bottom(self.SPACING)
-            self._grid.attach(scale, pos, 0, 1, 1)
-            self._grid.attach(btn, pos, 1, 1, 1)
-            pos += 1
-
-        # separator
-        if self._volctl.pa_mgr.pa_sink_inputs:
-            separator = Gtk.Separator().new(Gtk.Orientation.VERTICAL)
-            separator.set_margin_top(self.SPACING)
-            separator.set_margin_bottom(self.SPACING)
-            self._grid.attach(separator, pos, 0, 1, 2)
-            pos += 1
-
-        # sink inputs
-        for _, sink_input in self._volctl.pa_mgr.pa_sink_inputs.items():
-            scale, btn = self._add_scale(sink_input)
-            self._sink_input_scales[sink_input.idx] = (scale, btn)
-            scale.connect("value-changed", self._cb_sink_input_scale_change)
-            self._update_scale_values((scale, btn), sink_input.volume, sink_input.mute)
-            scale.set_margin_top(self.SPACING)
-            btn.set_margin_bottom(self.SPACING)
-            self._grid.attach(scale, pos, 0, 1, 1)
-            self._grid.attach(btn, pos, 1, 1, 1)
-            pos += 1
-
-        pa_threaded_mainloop_unlock(self._volctl.pa_mgr.mainloop)
+        items = [(("sink", idx), sink) for idx, sink in pa_mgr.pa_sinks.items()]
+        self._sink_count = len(items)
+        items += self._sink_input_items(
+            pa_mgr.pa_sink_inputs,
+            self._volctl.settings.get_string("group-sink-inputs"),
+        )
+        self._items = items
+        changed = self._layout()
+
+        visible = self.get_visible()
+        if self._spectrum_analyzer is not None and visible:
+            self._update_spectrum_source()
+
+        pa_threaded_mainloop_unlock(pa_mgr.mainloop)
+
+        if changed and visible:
+            self.resize(1, 1)  # smallest possible
+            GObject.idle_add(self._set_position)
+        self.reconcile_time = time.perf_counter() - start
+
+    def _sink_input_items(self, sink_inputs, mode):
+        """Sink input items, grouped unless mode is "none"."""
+        if mode == "none":
+            self._groups = {}
+            self._group_of = {}
+            return [
+                (("input", idx), sink_input) for idx, sink_input in sink_inputs.items()
+            ]
+
+        by_key = {}
+        for _, sink_input in sink_inputs.items():
+            key = SinkInputGroup.group_key(sink_input, mode)
+            by_key.setdefault(key, []).append(sink_input)
+
+        items = []
+        groups = {}
+        group_of = {}
+        for key, members in by_key.items():
+            if len(members) == 1:
+                items.append((("input", members[0].idx), members[0]))
+                continue
+            group = self._groups.get(key)
+            if group is None:
+                group = SinkInputGroup(key)
+            group.set_members(members)
+            groups[key] = group
+            items.append((("group", key), group))
+            for member in members:
+                group_of[member.idx] = group
+                if key in self._expanded:
+                    items.append((("input", member.idx), member))
+        self._groups = groups
+        self._group_of = group_of
+        self._expanded &= set(groups)
+        return items
+
+    def _layout(self):
+        """Bind columns to visible slice of items. Returns True on changes."""
+        count = len(self._items)
+        visible = min(count, self._max_columns)
+        self._offset = max(0, min(self._offset, count - visible))
+        self._adjustment.configure(self._offset, 0, count, 1, visible, visible)
+        self._scrollbar.set_visible(count > visible)
+
+        changed = False
+        while len(self._columns) < visible:
+            self._columns.append(self._add_column())
+            changed = True
+
+        # sinks first, then separator and sink inputs
+        separator_pos = None
+        shift = 0
+        for i, column in enumerate(self._columns):
+            if i >= visible:
+                if column.sink is not None:
+                    self._unbind_column(column)
+                    changed = True
+                continue
+            key, sink = self._items[self._offset + i]
+            if self._offset + i == self._sink_count:
+                separator_pos = i
+                shift = 1
+            if column.sink is not sink:
+                self._unbind_column(column)
+                self._bind_column(column, key, sink)
+                changed = True
+            elif key[0] == "group":
+                # members might have changed
+                self._show_values(column)
+            else:
+                column.update_labels(sink.name, self._resolve_icon(sink))
+            if column.pos != i + shift:
+                self._move_column(column, i + shift)
+                changed = True
+        if separator_pos != self._separator_pos:
+            self._move_separator(separator_pos)
+            changed = True
+        return changed
+
+    def _scales_meters(self, kind):
+        if kind == "sink":
+            return self._sink_scales, self._sink_meters
+        if kind == "group":
+            return self._group_scales, self._group_meters
+        return self._sink_input_scales, self._sink_input_meters
+
+    def _bind_column(self, column, key, sink):
+        column.key = key
+        column.sink = sink
+        scales, meters = self._scales_meters(key[0])
+        scales[key[1]] = (column.scale, column.btn)
+        if column.meter is not None:
+            channels = sink.get_meter_channels(self._vu_per_channel)
+            column.meter.set_channels(channels)
+            column.meter.set_levels(())
+            meters[key[1]] = column.meter
+        self._show_values(column)
+        column.expander.set_visible(key[0] == "group")
+        column.top.show()
+        column.btn.show()
+
+    def _resolve_icon(self, sink):
+        return self._volctl.icons.resolve(
+            sink.icon_name, sink.app_id, sink.app_binary, sink.app_name
+        )
 
-        self.show_all()
-        self.resize(1, 1)  # smallest possible
-        GObject.idle_add(self._set_position)
+    def _show_values(self, column):
+        sink = column.sink
+        column.update_labels(sink.name, self._resolve_icon(sink))
+        # no writes to PulseAudio while showing its values
+        for widget, handler in column.handlers:
+            widget.handler_block(handler)
+        self._update_scale_values((column.scale, column.btn), sink.volume, sink.mute)
+        for widget, handler in column.handlers:
+            widget.handler_unblock(handler)
+        if column.key[0] == "group":
+            expanded = column.key[1] in self._expanded
+            column.expander.get_image().set_from_icon_name(
+                "list-remove-symbolic" if expanded else "list-add-symbolic",
+                Gtk.IconSize.MENU,
+            )
+            column.expander.set_tooltip_text(
+                "Hide streams" if expanded else "Show streams"
+            )
 
-    def _add_scale(self, sink):
+    def _unbind_column(self, column):
+        if column.key is not None:
+            kind, idx = column.key
+            scales, meters = self._scales_meters(kind)
+            # might be bound to another column already
+            if scales.get(idx, (None,))[0] is column.scale:
+                del scales[idx]
+            if meters.get(idx) is column.meter:
+                del meters[idx]
+        column.key = None
+        column.sink = None
+        column.top.hide()
+        column.btn.hide()
+        column.expander.hide()
+
+    def _add_column(self):
+        scale, btn, meter = self._add_scale()
+        btn.set_margin_bottom(self.SPACING)
+        top = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL)
+        top.set_margin_top(self.SPACING)
+        top.pack_start(scale, True, True, 0)
+        if meter is not None:
+            top.pack_start(meter, False, True, 2)
+        expander = Gtk.Button()
+        expander.set_image(Gtk.Image())
+        expander.set_relief(Gtk.ReliefStyle.NONE)
+        expander.set_no_show_all(True)
+        column = SliderColumn(scale, btn, meter, top, expander, self._volctl.icons)
+        expander.connect("clicked", self._cb_expand, column)
+        scale.connect("scroll-event", self._cb_scale_scroll, column)
+        column.handlers = [
+            (scale, scale.connect("value-changed", self._cb_scale_change, column)),
+            (btn, btn.connect("toggled", self._cb_mute_toggle, column)),
+        ]
+        if self._spectrum_analyzer is not None:
+            scale.connect("enter-notify-event", self._cb_scale_enter, column)
+        top.show_all()
+        btn.show_all()
+        return column
+
+    def _move_column(self, column, pos):
+        if column.pos is None:
+            self._grid.attach(column.top, pos, 0, 1, 1)
+            self._grid.attach(column.btn, pos, 1, 1, 1)
+            self._grid.attach(column.expander, pos, 2, 1, 1)
+        else:
+            self._grid.child_set_property(column.top, "left-attach", pos)
+            self._grid.child_set_property(column.btn, "left-attach", pos)
+            self._grid.child_set_property(column.expander, "left-attach", pos)
+        column.pos = pos
+
+    def _move_separator(self, pos):
+        if self._separator_pos is not None:
+            self._grid.remove(self._separator)
+        if pos is not None:
+            self._grid.attach(self._separator, pos, 0, 1, 2)
+            self._separator.show()
+        self._separator_pos = pos
+
+    def _add_scale(self):
         # scale
         scale = Gtk.Scale().new(Gtk.Orientation.VERTICAL)
         scale.set_range(PA_VOLUME_MUTED, PA_VOLUME_NORM)
         scale.set_inverted(True)
         scale.set_size_request(24, 128)
-        scale.set_tooltip_text(sink.name)
+        scale.add_events(Gdk.EventMask.SMOOTH_SCROLL_MASK)
         self._set_increments_on_scale(scale)
         if self._show_percentage:
             scale.set_draw_value(True)
@@ -163,22 +488,43 @@ class VolumeSliders(Gtk.Window):
         else:
             scale.set_draw_value(False)
 
+        meter = None
         if self._volctl.settings.get_boolean("vu-enabled"):
-            scale.set_has_origin(False)
-            scale.set_show_fill_level(False)
-            scale.set_fill_level(0)
-            scale.set_restrict_to_fill_level(False)
+            meter = ChannelMeter(1)
+            meter.set_margin_bottom(self.SPACING)
 
         # mute button
-        icon = Gtk.Image()
-        icon.set_from_icon_name(sink.icon_name, Gtk.IconSize.SMALL_TOOLBAR)
         btn = Gtk.ToggleButton()
-        btn.set_image(icon)
+        btn.set_image(Gtk.Image())
         btn.set_relief(Gtk.ReliefStyle.NONE)
-        btn.set_tooltip_text(sink.name)
-        btn.connect("toggled", self._cb_mute_toggle, sink)
 
-        return scale, btn
+        return scale, btn, meter
+
+    def _update_spectrum_source(self):
+        """Keep analyzing current source if it still exists, else main sink."""
+        pa_mgr = self._volctl.pa_mgr
+        source = self._spectrum_source
+        if source is not None and source not in (
+            pa_mgr.pa_sinks.get(source.idx),
+            pa_mgr.pa_sink_inputs.get(source.idx),
+        ):
+            source = None
+        if source is None:
+            try:
+                source = pa_mgr.get_main_sink()
+            except KeyError:
+                pass
+        self._set_spectrum_source(source)
+
+    def _set_spectrum_source(self, sink):
+        if sink is self._spectrum_source:
+            return
+        if self._spectrum_source is not None:
+            self._spectrum_source.stop_monitor_spectrum()
+        self._spectrum_source = sink
+        self._spectrum_analyzer.reset()
+        if sink is not None:
+            sink.monitor_spectrum(self._spectrum_analyzer)
 
     @staticmethod
     def _update_scale_values(scale_btn, volume, mute):
@@ -189,13 +535,22 @@ class VolumeSliders(Gtk.Window):
             btn.set_active(mute)
 
     @staticmethod
-    def _update_scale_peak(scale, val):
-        if val > 0:
-            scale.set_show_fill_level(True)
-            scale.set_fill_level(val * PA_VOLUME_NORM)
-        else:
-            scale.set_show_fill_level(False)
-            scale.set_fill_level(0)
+    def _update_scale_loudness(scale_btn, reading):
+        scale, btn = scale_btn
+
+        def fmt(val):
+            return "{:.1f}".format(val) if val > -math.inf else "--"
+
+        # button tooltip always holds the plain name
+        scale.set_tooltip_text(
+            "{}\nM {}  S {}  I {} LUFS\nTrue peak {} dBTP".format(
+                btn.get_tooltip_text(),
+                fmt(reading.momentary),
+                fmt(reading.short_term),
+                fmt(reading.integrated),
+                fmt(reading.true_peak),
+            )
+        )
 
     def _enable_timeout(self):
         if self._volctl.settings.get_boolean("auto-close") and self._timeout is None:
@@ -218,29 +573,59 @@ class VolumeSliders(Gtk.Window):
             return
         self._update_scale_values(scale_btn, volume, mute)
 
-    def update_sink_input_scale(self, idx, volume, mute):
-        """Update sink input scale by index."""
+    def update_sink_input_scale(self, idx, volume, mute, external=True):
+        """
+        Update sink input scale by index. external is False for the echo of
+        our own write.
+        """
         try:
             scale_btn = self._sink_input_scales[idx]
+        except KeyError:
+            pass
+        else:
+            self._update_scale_values(scale_btn, volume, mute)
+        group = self._group_of.get(idx)
+        if group is not None and external:
+            group.refresh_ratios()  # changed by another client
+        if group is not None and group.key in self._group_scales:
+            self._update_scale_values(
+                self._group_scales[group.key], group.volume, group.mute
+            )
+
+    def update_sink_scale_peak(self, idx, vals):
+        """Update sink scale peak values (one per channel) by index."""
+        self._update_peak(idx, vals, self._sink_meters)
+
+    def update_sink_input_scale_peak(self, idx, vals):
+        """Update sink input peak values (one per channel) by index."""
+        self._update_peak(idx, vals, self._sink_input_meters)
+        group = self._group_of.get(idx)
+        if group is not None:
+            group.levels[idx] = max(vals)
+            self._update_peak(group.key, (group.level,), self._group_meters)
+
+    def update_sink_scale_loudness(self, idx, reading):
+        """Show sink loudness reading by index."""
+        try:
+            scale_btn = self._sink_scales[idx]
         except KeyError:
             return
-        self._update_scale_values(scale_btn, volume, mute)
+        self._update_scale_loudness(scale_btn, reading)
 
-    def update_sink_scale_peak(self, idx, val):
-        """Update sink scale peak value by index."""
+    def update_sink_input_scale_loudness(self, idx, reading):
+        """Show sink input loudness reading by index."""
         try:
-            scale, _ = self._sink_scales[idx]
+            scale_btn = self._sink_input_scales[idx]
         except KeyError:
             return
-        self._update_scale_peak(scale, val)
+        self._update_scale_loudness(scale_btn, reading)
 
-    def update_sink_input_scale_peak(self, idx, val):
-        """Update sink input peak value by index."""
+    def _update_peak(self, idx, vals, meters):
         try:
-            scale, _ = self._sink_input_scales[idx]
+            meter = meters[idx]
         except KeyError:
             return
-        self._update_scale_peak(scale, val)
+        self._level_table.set_levels(meter, vals)
 
     # gui callbacks
 
@@ -249,25 +634,76 @@ class VolumeSliders(Gtk.Window):
         """Format scale label"""
         return "{:d}%".format(round(100 * val / PA_VOLUME_NORM))
 
-    def _cb_sink_scale_change(self, scale):
+    def _cb_scale_change(self, scale, column):
         value = int(scale.get_value())
-        idx = self._find_sink_idx_by_scale(scale)
-
-        if idx >= 0:
-            pa_threaded_mainloop_lock(self._volctl.pa_mgr.mainloop)
-            sink = self._volctl.pa_mgr.pa_sinks[idx]
+        sink = column.sink
+        pa_threaded_mainloop_lock(self._volctl.pa_mgr.mainloop)
+        # don't write back values coming from the server
+        if value != sink.volume:
             sink.set_volume(value)
-            pa_threaded_mainloop_unlock(self._volctl.pa_mgr.mainloop)
+            group = None
+            if column.key[0] == "input":
+                group = self._group_of.get(sink.idx)
+            if group is not None:
+                group.refresh_ratios()  # member moved on its own
+        pa_threaded_mainloop_unlock(self._volctl.pa_mgr.mainloop)
 
-    def _cb_sink_input_scale_change(self, scale):
-        value = int(scale.get_value())
-        idx = self._find_sink_input_idx_by_scale(scale)
+    def _cb_scale_scroll(self, scale, event, column):
+        steps = scroll_steps(event)
+        if steps is None:
+            return False
+        # coalesced, scale moves (and writes) once per frame
+        self._scroll.add((column, column.sink), steps)
+        return True
+
+    def _apply_scroll(self, target, steps):
+        column, sink = target
+        if column.sink is not sink:
+            return  # column was rebound meanwhile
+        value = column.scale.get_value()
+        value += steps * PA_VOLUME_NORM / self._volctl.mouse_wheel_step
+        column.scale.set_value(min(max(value, PA_VOLUME_MUTED), PA_VOLUME_NORM))
+
+    def _cb_scale_enter(self, scale, event, column):
+        sink = column.sink
+        if column.key[0] == "group":
+            sink = sink.members[0]
+        pa_threaded_mainloop_lock(self._volctl.pa_mgr.mainloop)
+        self._set_spectrum_source(sink)
+        pa_threaded_mainloop_unlock(self._volctl.pa_mgr.mainloop)
 
-        if idx >= 0:
-            pa_threaded_mainloop_lock(self._volctl.pa_mgr.mainloop)
-            sink_input = self._volctl.pa_mgr.pa_sink_inputs[idx]
-            sink_input.set_volume(value)
-            pa_threaded_mainloop_unlock(self._volctl.pa_mgr.mainloop)
+    def _cb_expand(self, button, column):
+        key = column.key[1]
+        if key in self._expanded:
+            self._expanded.remove(key)
+        else:
+            self._expanded.add(key)
+        self.reconcile_sliders()
+        self._volctl.start_vu(restart=False)
+
+    def _cb_destroy(self, _):
+        pa_threaded_mainloop_lock(self._volctl.pa_mgr.mainloop)
+        self._set_spectrum_source(None)
+        pa_threaded_mainloop_unlock(self._volctl.pa_mgr.mainloop)
+
+    def _cb_scroll_changed(self, adjustment):
+        offset = int(adjustment.get_value())
+        if offset == self._offset:
+            return
+        self._offset = offset
+        pa_threaded_mainloop_lock(self._volctl.pa_mgr.mainloop)
+        self._layout()
+        pa_threaded_mainloop_unlock(self._volctl.pa_mgr.mainloop)
+        # meters follow the visible columns
+        self._volctl.start_vu(restart=False)
+
+    def _cb_draw(self, widget, cairo_r):
+        if self._popup_start is not None:
+            latency = time.perf_counter() - self._popup_start
+            self._popup_start = None
+            self.popup_latency = latency
+            self.popup_latency_max = max(self.popup_latency_max, latency)
+        return False
 
     def _cb_enter_notify(self, win, event):
         if (
@@ -288,23 +724,12 @@ class VolumeSliders(Gtk.Window):
         self._volctl.close_slider()
         return GLib.SOURCE_REMOVE
 
-    def _cb_mute_toggle(self, button, sink):
+    def _cb_mute_toggle(self, button, column):
         mute = button.get_property("active")
+        sink = column.sink
+        # echo of own write is not applied to widgets
+        column.scale.set_sensitive(not mute)
         pa_threaded_mainloop_lock(self._volctl.pa_mgr.mainloop)
-        sink.set_mute(mute)
+        if mute != sink.mute:
+            sink.set_mute(mute)
         pa_threaded_mainloop_unlock(self._volctl.pa_mgr.mainloop)
-
-    # find sinks
-
-    def _find_sink_idx_by_scale(self, scale):
-        return self._find_idx_by_scale(scale, self._sink_scales)
-
-    def _find_sink_input_idx_by_scale(self, scale):
-        return self._find_idx_by_scale(scale, self._sink_input_scales)
-
-    @staticmethod
-    def _find_idx_by_scale(scale, scales):
-        for idx, val in scales.items():
-            if scale == val[0]:
-                return idx
-        return -1
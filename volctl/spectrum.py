@@ -0,0 +1,76 @@
+"""
+Spectrum view
+
+Bar graph of a SpectrumAnalyzer, analyzed and redrawn on the frame clock.
+The frame clock is only used while there is data to show.
+"""
+
+import time
+from gi.repository import Gtk, GLib
+
+
+class SpectrumView(Gtk.DrawingArea):
+    """Draws spectrum analyzer band levels."""
+
+    HEIGHT = 64
+    MAX_FPS = 30
+    CPU_BUDGET = 0.004  # analysis time per frame in seconds
+    BAR_SPACING = 1
+
+    def __init__(self, analyzer):
+        super().__init__()
+        self._analyzer = analyzer
+        self._last_frame_time = 0
+        self._cost = 0.0
+        self.set_size_request(-1, self.HEIGHT)
+        self.connect("draw", self._cb_draw)
+        self._tick = self.add_tick_callback(self._cb_tick)
+
+    def _cb_data(self):
+        # PulseAudio thread
+        GLib.idle_add(self._start_ticking)
+
+    def _start_ticking(self):
+        if self._tick is None:
+            self._tick = self.add_tick_callback(self._cb_tick)
+        return GLib.SOURCE_REMOVE
+
+    def _cb_tick(self, widget, frame_clock):
+        frame_time = frame_clock.get_frame_time()  # in µs
+        if frame_time - self._last_frame_time < 1000000 / self.MAX_FPS:
+            return GLib.SOURCE_CONTINUE
+        self._last_frame_time = frame_time
+
+        start = time.perf_counter()
+        changed = self._analyzer.analyze()
+        # exponential moving average of analysis cost
+        self._cost = 0.9 * self._cost + 0.1 * (time.perf_counter() - start)
+        if self._cost > self.CPU_BUDGET and self._analyzer.degrade():
+            self._cost = 0.0
+
+        if changed:
+            self.queue_draw()
+            return GLib.SOURCE_CONTINUE
+        # no new samples and levels decayed, sleep until samples arrive
+        self._tick = None
+        self._analyzer.wait(self._cb_data)
+        return GLib.SOURCE_REMOVE
+
+    def _cb_draw(self, widget, cairo_r):
+        width = widget.get_allocated_width()
+        height = widget.get_allocated_height()
+        color = widget.get_style_context().get_color(widget.get_state_flags())
+        cairo_r.set_source_rgba(color.red, color.green, color.blue, 0.6)
+
+        levels = self._analyzer.levels
+        bar_width = width / len(levels)
+        for i, level in enumerate(levels):
+            bar_height = round(level * height)
+            if bar_height > 0:
+                cairo_r.rectangle(
+                    i * bar_width,
+                    height - bar_height,
+                    max(bar_width - self.BAR_SPACING, 1),
+                    bar_height,
+                )
+        cairo_r.fill()
@@ -1,6 +1,8 @@
 """volctl tray icon"""
 
 from math import floor
+import time
+import cairo
 from gi.repository import Gtk, Gdk, GLib
 
 from volctl.lib.pulseaudio import (
@@ -9,23 +11,41 @@ from volctl.lib.pulseaudio import (
     pa_threaded_mainloop_lock,
     pa_threaded_mainloop_unlock,
 )
+from volctl.scroll import ScrollAccumulator, scroll_steps
 
 
 class TrayIcon(Gtk.StatusIcon):
     """Volume control tray icon."""
 
+    LEVEL_FRAMES = 8  # pre-rendered level steps, 0 shows no bar
+    LEVEL_INTERVAL = 100  # ms, caps live level icon updates at 10 per sec
+
     def __init__(self, volctl):
         super().__init__()
         self.initialized = False
         self._volctl = volctl
         self._volume = 0
         self._mute = False
+        self._scroll = ScrollAccumulator(self._apply_scroll)
+        self._scroll_target = None  # last volume written by scrolling
+        self._icon_name = "audio-volume-muted"  # icon for volume state
+        self._shown = None  # icon name or (icon name, size, frame) pushed to tray
+        self._tooltip = None  # (percentage, mute, markup)
+        self.icon_updates = 0
+
+        # live level
+        self._size = 0
+        self._level = 0.0
+        self._level_timeout = None
+        self._frames = {}  # (icon name, size) -> list of pixbufs (or None)
         GLib.idle_add(self._setup_statusicon)
 
     def update_values(self, volume, mute):
         """Remember current volume and mute values."""
         self._volume = volume
         self._mute = mute
+        if not self._scroll.pending:
+            self._scroll_target = None
         self._update_icon()
         # Consider completely initialized when first volume update was processed
         self.initialized = True
@@ -38,8 +58,79 @@ class TrayIcon(Gtk.StatusIcon):
         else:
             idx = min(int(floor(value * 3)), 2)
             state = ["low", "medium", "high"][idx]
-        icon_name = "audio-volume-%s" % state
-        self.set_from_icon_name(icon_name)
+        self._icon_name = "audio-volume-%s" % state
+        self._show_icon()
+
+    def set_level(self, level):
+        """Default sink output level (0.0 - 1.0) for the live level icon."""
+        self._level = level
+
+    def _show_icon(self):
+        """Push icon to the tray, only if it differs from what is shown."""
+        if self._level_timeout is None:
+            key = self._icon_name
+        else:
+            frame = 0
+            if not self._mute:
+                level = min(max(self._level, 0.0), 1.0)
+                frame = round(level * (self.LEVEL_FRAMES - 1))
+            key = (self._icon_name, self._size, frame)
+        if key == self._shown:
+            return
+        self._shown = key
+        self.icon_updates += 1
+
+        pixbuf = None
+        if isinstance(key, tuple):
+            pixbuf = self._level_frames(self._icon_name, self._size)[key[2]]
+        if pixbuf is None:
+            self.set_from_icon_name(self._icon_name)
+        else:
+            self.set_from_pixbuf(pixbuf)
+
+    def _level_frames(self, icon_name, size):
+        """Icon with level bars, rendered once per icon and size."""
+        try:
+            return self._frames[(icon_name, size)]
+        except KeyError:
+            pass
+        frames = [None] * self.LEVEL_FRAMES
+        base = self._volctl.icons.pixbuf(icon_name, size) if size > 0 else None
+        if base is not None:
+            bar_width = max(2, size // 8)
+            for frame in range(self.LEVEL_FRAMES):
+                surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, size, size)
+                cairo_r = cairo.Context(surface)
+                Gdk.cairo_set_source_pixbuf(cairo_r, base, 0, 0)
+                cairo_r.paint()
+                height = round(size * frame / (self.LEVEL_FRAMES - 1))
+                if height > 0:
+                    cairo_r.rectangle(
+                        size - bar_width + 0.5,
+                        size - height + 0.5,
+                        bar_width - 1,
+                        height - 1,
+                    )
+                    cairo_r.set_source_rgba(1.0, 1.0, 1.0, 0.9)
+                    cairo_r.fill_preserve()
+                    cairo_r.set_source_rgba(0.0, 0.0, 0.0, 0.6)
+                    cairo_r.set_line_width(1.0)
+                    cairo_r.stroke()
+                frames[frame] = Gdk.pixbuf_get_from_surface(surface, 0, 0, size, size)
+        self._frames[(icon_name, size)] = frames
+        return frames
+
+    def _set_level_enabled(self, enabled):
+        if enabled and self._level_timeout is None:
+            self._level_timeout = GLib.timeout_add(
+                self.LEVEL_INTERVAL, self._cb_level_timeout
+            )
+        elif not enabled and self._level_timeout is not None:
+            GLib.Source.remove(self._level_timeout)
+            self._level_timeout = None
+            self._frames.clear()
+            self._level = 0.0
+        self._show_icon()
 
     # gui setup
 
@@ -54,6 +145,10 @@ class TrayIcon(Gtk.StatusIcon):
         self.connect("scroll-event", self._cb_scroll)
         self.connect("query-tooltip", self._cb_tooltip)
         self.connect("notify::embedded", self._cb_notify_embedded)
+        self.connect("size-changed", self._cb_size_changed)
+        Gtk.IconTheme.get_default().connect("changed", self._cb_theme_changed)
+        self._volctl.settings.connect("changed::tray-level", self._cb_tray_level)
+        self._set_level_enabled(self._volctl.settings.get_boolean("tray-level"))
 
     def _setup_menu(self):
         self._menu = Gtk.Menu()
@@ -95,15 +190,39 @@ class TrayIcon(Gtk.StatusIcon):
     # gui callbacks
 
     def _cb_notify_embedded(self, *_):
+        self._shown = None  # (re-)embedded tray needs the icon
         self._update_icon()
 
+    def _cb_size_changed(self, _, size):
+        self._size = size
+        self._frames.clear()
+        self._shown = None
+        self._show_icon()
+        return False
+
+    def _cb_theme_changed(self, _):
+        self._frames.clear()
+        self._shown = None
+
+    def _cb_tray_level(self, settings, key):
+        self._set_level_enabled(settings.get_boolean(key))
+
+    def _cb_level_timeout(self):
+        self._show_icon()
+        return GLib.SOURCE_CONTINUE
+
     def _cb_tooltip(self, item, xcoord, ycoord, keyboard_mode, tooltip):
         # pylint: disable=too-many-arguments
-        perc = float(self._volume) / float(PA_VOLUME_NORM) * 100
-        text = "Volume: %.0f%%" % perc
-        if self._mute:
-            text += ' <span weight="bold">(muted)</span>'
-        tooltip.set_markup(text)
+        # StatusIcon has no enter-notify, tooltip queries signal hovering
+        if not keyboard_mode:
+            self._volctl.warm_up()
+        perc = round(float(self._volume) / float(PA_VOLUME_NORM) * 100)
+        if self._tooltip is None or self._tooltip[:2] != (perc, self._mute):
+            text = "Volume: %d%%" % perc
+            if self._mute:
+                text += ' <span weight="bold">(muted)</span>'
+            self._tooltip = (perc, self._mute, text)
+        tooltip.set_markup(self._tooltip[2])
         return True
 
     def _cb_menu_mute(self, widget):
@@ -124,28 +243,35 @@ class TrayIcon(Gtk.StatusIcon):
         self._volctl.quit()
 
     def _cb_scroll(self, widget, event):
-        old_vol = self._volume
-        amount = PA_VOLUME_NORM / self._volctl.mouse_wheel_step
-        if event.direction == Gdk.ScrollDirection.DOWN:
-            amount *= -1
-        elif event.direction == Gdk.ScrollDirection.UP:
-            pass
-        else:
+        steps = scroll_steps(event)
+        if steps is None:
             return
+
+        # user action prolongs auto-close timer
+        sliders_win = self._volctl.sliders_win
+        if sliders_win is not None and sliders_win.get_visible():
+            sliders_win.reset_timeout()
+
+        self._scroll.add(None, steps)
+
+    def _apply_scroll(self, _, steps):
+        # continue from our last write, its echo may still be in flight
+        old_vol = self._volume if self._scroll_target is None else self._scroll_target
+        amount = steps * PA_VOLUME_NORM / self._volctl.mouse_wheel_step
         new_value = old_vol + amount
         new_value = min(PA_VOLUME_NORM, new_value)
         new_value = max(PA_VOLUME_MUTED, new_value)
         new_value = int(new_value)
-
-        # user action prolongs auto-close timer
-        if self._volctl.sliders_win is not None:
-            self._volctl.sliders_win.reset_timeout()
+        if new_value == old_vol:
+            return
+        self._scroll_target = new_value
 
         pa_threaded_mainloop_lock(self._volctl.pa_mgr.mainloop)
         self._volctl.pa_mgr.set_main_volume(new_value)
         pa_threaded_mainloop_unlock(self._volctl.pa_mgr.mainloop)
 
     def _cb_button_press(self, widget, event):
+        start = time.perf_counter()
         if event.button == 1:
             if event.type == Gdk.EventType.BUTTON_PRESS:
                 if not self._volctl.close_slider():
@@ -153,7 +279,7 @@ class TrayIcon(Gtk.StatusIcon):
                         event.x_root, event.y_root
                     )
                     monitor_rect = monitor.get_workarea()
-                    self._volctl.show_slider(monitor_rect)
+                    self._volctl.show_slider(monitor_rect, start)
             if event.type == Gdk.EventType.DOUBLE_BUTTON_PRESS:
                 self._volctl.launch_mixer()
 